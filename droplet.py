@@ -7,8 +7,9 @@ Uses a mathematical model devised by Dr. T. Wassenaar
     see povray/drop.py
 """
 
+import numpy as np
 from pypovray import pypovray, drop, load_config, SETTINGS, models
-from vapory.vapory import Camera, Scene, Sphere, Cylinder, Pigment, Merge
+from vapory.vapory import Camera, Scene, Sphere, Cylinder, Pigment, Merge, SphereArray
 
 
 def scene(step):
@@ -33,15 +34,14 @@ def scene(step):
 
     ''' The 'coordinates' is a list containing three-element lists with x- y- and z-coordinates
     that we can use to draw Spheres (this example) or for positioning lipoproteins etc. '''
-    spheres = []
+    # Use the coordinates to place a sphere with radius 1 on each of them, all
+    # spheres being written as one SphereArray object
+    spheres = [SphereArray(np.array(coordinates).reshape((-1, 4))[:, :3], 1,
+                           None, [Pigment('color', [1, 1, 1])])]
     lipos = []
     lipo_length = 2
 
     for coord in coordinates:
-        # Use the coordinates to place a sphere with radius 1
-        spheres.append(Sphere([coord[0], coord[1], coord[2]], 1,
-                       Pigment('color', [1, 1, 1])))
-
         if coord[3] != 0:
             '''
             These 'lipos' are placeholders for either atomic models of lipoproteins or can be altered
@@ -330,10 +330,11 @@ def activation(frame):
     return
 
 
-def frame(step):
-    """ Returns the scene at step number (1 step per frame) """
-
-    camera = Camera('location', [0, 7, -200], 'look_at', [0, 0, 0])
+def make_schematic():
+    """
+    Creates the objects of the schematic view that never move (lights, membrane,
+    receptor and tyrine). They are built once and given to the scenes as static objects
+    """
     lights = [LightSource([0, -10, -60], 0.5),
               LightSource([0, -50, -60], 0.5),
               ]
@@ -341,23 +342,34 @@ def frame(step):
     receptor = make_receptor([0, 0, -2], 5)
     membrane = make_membrane([0, 0, 0], 10, 5)
     tyrine = make_tyrine([0, 0, -2], 5)
+
+    return [models.default_light] + tyrine + membrane + receptor + tyrine + lights
+
+
+SCHEMATIC = make_schematic()
+
+
+def frame(step):
+    """ Returns the scene at step number (1 step per frame) """
+
+    camera = Camera('location', [0, 7, -200], 'look_at', [0, 0, 0])
     alphact_stage_one_sliced, alphact_stage_two_sliced = slice_alphact()
 
     seconds = step / 30
     if seconds < 1:  # Frame 0 -> 30
         return Scene(camera,
-                objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights)
+                static=SCHEMATIC)
 
     elif seconds < 4:  # Frame 30 -> 120
         insuline_schematic = bind_schematic(step, 5)
         return Scene(camera,
-                 objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights + insuline_schematic)
+                 static=SCHEMATIC, objects=insuline_schematic)
 
     elif seconds < 6:  # Frame 120 -> 180
         insuline_schematic = bind_schematic(step, 5)
         camera = move_camera(step, 60, [0, 7, -200], [-20, 20, 3], 120)
         return Scene(camera,
-                 objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights + insuline_schematic)
+                 static=SCHEMATIC, objects=insuline_schematic)
 
     elif seconds < 8:  # Frame 180 -> 240
         camera = Camera('location', [0, 0, -300], 'look_at', [0, 0, 0])
@@ -403,26 +415,26 @@ def frame(step):
             camera = move_camera(step, 39, [0, 0, 3], [0, 7, -200], 441)
             insuline_schematic = bind_schematic(step, 5)
             return Scene(camera,
-                 objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights + insuline_schematic)
+                 static=SCHEMATIC, objects=insuline_schematic)
     
     elif seconds < 19:   #Frame 480 -> 570
             insuline_schematic = bind_schematic(step, 5)
             phosphorus = bind_phosphorus(step, 5)
             return Scene(camera,
-                 objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights + insuline_schematic + phosphorus)
+                 static=SCHEMATIC, objects=insuline_schematic + phosphorus)
     
     elif seconds < 21:   #Frame 570 -> 630
         insuline_schematic = bind_schematic(step, 5)
         phosphorus = bind_phosphorus(step, 5)
         IRS = bind_IRS(step, 5)
         return Scene(camera,
-            objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights + insuline_schematic + phosphorus + IRS)
+            static=SCHEMATIC, objects=insuline_schematic + phosphorus + IRS)
 
     insuline_schematic = bind_schematic(step, 5)
     phosphorus = bind_phosphorus(step, 5)
     IRS = bind_IRS(step, 5)
     return Scene(camera,
-        objects=[models.default_light] + tyrine + membrane + receptor + tyrine + lights + insuline_schematic + phosphorus + IRS)
+        static=SCHEMATIC, objects=insuline_schematic + phosphorus + IRS)
 
 def main(args):
     """ Main function performing the rendering """
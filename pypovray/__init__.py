@@ -1,4 +1,5 @@
 import logging
+import sys
 from pypovray import config
 
 # Default configuration file located in the project root
@@ -7,6 +8,39 @@ DEFAULT_CONFIG = 'default.ini'
 # Use as SETTINGS.Quality, SETTINGS.MovieFPS, etc.
 SETTINGS = config.Config(DEFAULT_CONFIG)
 
+# Command line options accepted by every script using pypovray, mapped to the
+# (setting, value) they override; a value of None takes the next argument (or
+# the part after '=', as in --profile=draft). They are removed from sys.argv on
+# import, so the scripts' own argument parsing is not affected.
+CLI_OPTIONS = {'--scene-profile': ('SceneProfile', 'True'),
+               '--render-stats': ('RenderStats', 'True'),
+               '--profile': ('RenderProfile', None)}
+
+
+def apply_cli_options(settings, argv):
+    """ Removes the pypovray options from the `argv` list and stores them as
+    overrides in the `settings` """
+    for option, (setting, value) in CLI_OPTIONS.items():
+        index = 1
+        while index < len(argv):
+            argument = argv[index]
+            if argument == option:
+                del argv[index]
+                if value is None:
+                    if index == len(argv):
+                        raise ValueError("Option {} requires a value".format(option))
+                    settings.overrides[setting] = argv.pop(index)
+                else:
+                    settings.overrides[setting] = value
+            elif value is None and argument.startswith(option + '='):
+                del argv[index]
+                settings.overrides[setting] = argument.split('=', 1)[1]
+            else:
+                index += 1
+
+
+apply_cli_options(SETTINGS, sys.argv)
+
 # Setup logging, reading log-level from the configuration file
 logging.basicConfig(level=logging._nameToLevel[SETTINGS.LogLevel])
 logger = logging.getLogger(__name__)
@@ -16,4 +50,6 @@ logger.info(' Using config file "%s"', DEFAULT_CONFIG)
 
 def load_config(config_file):
     logger.info(' Loading config file "%s"', config_file)
-    return config.Config(config_file)
\ No newline at end of file
+    settings = config.Config(config_file)
+    settings.overrides.update(SETTINGS.overrides)
+    return settings
\ No newline at end of file
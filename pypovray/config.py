@@ -11,8 +11,12 @@ class Config():
         self.config_file = config_file
         self.config = configparser.ConfigParser()
         self.config.read(self.config_file)
+        # Settings given on the command line, taking precedence over the file
+        self.overrides = {}
 
     def __getattr__(self, key):
+        if key in self.overrides:
+            return self._parse_setting_value([self.overrides[key]])
         setting_value = [self.config[section].get(key)
                          for section in self.config.sections()
                          if self.config[section].get(key)]
@@ -5,17 +5,24 @@ a PDB file.
 
 import math
 import numpy as np
-from vapory.vapory import Sphere, Cylinder, Text, Pigment, Texture, Finish, Intersection
+from vapory.vapory import (Sphere, Cylinder, Text, Pigment, Texture, Finish, Intersection,
+                           SphereArray, CylinderArray)
 from pypovray import SETTINGS, logger
 from pypovray.models import atom_colors, atom_sizes, text_model
 from scipy.linalg import expm, norm
+from scipy.spatial import cKDTree
 
 
 class PDBMolecule(object):
     """ Models a molecule for rendering using Povray given a PDB file """
 
-    def __init__(self, pdb_file, center=True, offset=[0, 0, 0], atoms=False, model=None):
-        """ Parses and renders the molecule given a PDB file """
+    def __init__(self, pdb_file, center=True, offset=[0, 0, 0], atoms=False, model=None,
+                 batched=False, surface_only=False):
+        """ Parses and renders the molecule given a PDB file. If 'batched' is set, all atoms
+            (and sticks) are rendered as a single SphereArray (CylinderArray) object, which is
+            much faster to build and write for large molecules. If 'surface_only' is set, atoms
+            a water molecule cannot reach (see buried_atoms) are left out of the space filling
+            model; only use this with opaque atom models. """
 
         # If a list of atoms is provided, use these instead of a PDB file
         # This allows dividing the molecule in segments, see divide()
@@ -47,6 +54,11 @@ class PDBMolecule(object):
         self.camera = None
 
         self.model = model
+        self.batched = batched
+        self.surface_only = surface_only
+        self.stick_model = False
+        # Mask of the buried atoms, kept as long as the molecule only moves rigidly
+        self._buried = None
         self.render_molecule(offset)
 
     def _parse_pdb(self, fname):
@@ -83,13 +95,51 @@ class PDBMolecule(object):
         return Sphere([element.x + offset[0], element.y + offset[1], element.z + offset[2]],
                       atom_sizes.get(element.element, 0.5), atom_model)
 
+    def _get_atoms(self, offset=[0, 0, 0]):
+        """ Creates the Povray objects for all (visible) atoms; a Sphere per atom or, for a
+            batched molecule, a single SphereArray """
+        atoms = self._visible_atoms()
+        if not self.batched:
+            return [self._get_atom(a, offset) for a in atoms]
+
+        centers = np.array([[a.x, a.y, a.z] for a in atoms]).reshape((-1, 3)) + offset
+        radii = [atom_sizes.get(a.element, 0.5) for a in atoms]
+        if self.model:
+            return [SphereArray(centers, radii, None, [self.model])]
+        texture_ids, textures = self._element_textures([a.element for a in atoms],
+                                                       Finish('phong', 0.9, 'reflection', 0.1))
+        return [SphereArray(centers, radii, texture_ids, textures)]
+
+    def _visible_atoms(self):
+        """ Returns all atoms, or only the surface atoms of a space filling model if
+            'surface_only' is set """
+        if not self.surface_only or self.stick_model:
+            return self.atoms
+        if self._buried is None or len(self._buried) != len(self.atoms):
+            coordinates = np.array([[a.x, a.y, a.z] for a in self.atoms]).reshape((-1, 3))
+            radii = np.array([atom_sizes.get(a.element, 0.5) for a in self.atoms])
+            self._buried = buried_atoms(coordinates, radii)
+            logger.debug("%d of %d atoms of '%s' are buried", self._buried.sum(),
+                         len(self.atoms), self.molecule)
+        return [atom for atom, buried in zip(self.atoms, self._buried) if not buried]
+
+    def _element_textures(self, elements, finish):
+        """ Creates one texture per distinct chemical element and returns the index of the
+            texture for each of the given elements, together with the textures """
+        distinct = sorted(set(elements))
+        self.warnings.update(e for e in distinct if e not in atom_colors)
+        index = {element: i for i, element in enumerate(distinct)}
+        textures = [Texture(Pigment('color', atom_colors.get(element, [0, 1, 1])), finish)
+                    for element in distinct]
+        return [index[element] for element in elements], textures
+
     def render_molecule(self, offset=[0, 0, 0]):
         """ Renders a molecule given a list with atoms """
         if self.show_name:
             self.show_label(camera=self.camera, name=True)
         if self.show_index:
             self.show_label(camera=self.camera, name=False)
-        self.povray_molecule = [self._get_atom(a, offset) for a in self.atoms]
+        self.povray_molecule = self._get_atoms(offset)
 
         # Warn if unknown atoms are found
         if len(self.warnings) > 0:
@@ -103,7 +153,7 @@ class PDBMolecule(object):
 
     def _update_render(self, offset=[0, 0, 0]):
         """ Updates the render without re-applying the labels """
-        self.povray_molecule = [self._get_atom(a, offset) for a in self.atoms]
+        self.povray_molecule = self._get_atoms(offset)
 
     def _center_of_mass(self):
         """ Calculates the 'center of mass' for the molecule
@@ -204,6 +254,8 @@ class PDBMolecule(object):
             atom.y = coordinates[1]
             atom.z = coordinates[2]
 
+        # Atoms may no longer overlap in the same way
+        self._buried = None
         # Update the rendering
         self._update_render()
 
@@ -278,15 +330,14 @@ class PDBMolecule(object):
            TODO's: see issue reported at:
            https://bitbucket.org/mkempenaar/pypovray/issues/9/pdb-rendering-ball-and-stick-model-todos
            """
-        # Declaring storage for all cylinders
-        sticks = []
+        # Declaring storage for all half-bonds as (start, end, element) tuples
+        halves = []
+        # All atoms are visible between the sticks
+        self.stick_model = True
         # Scale the atom distance using the default (or given) scaling number
         self.scale_atom_distance(scale)
 
         for serial, atom in enumerate(self.atoms):
-            # Declare a model that follows the atom's styling guidelines
-            stick_model_a = Texture(Pigment('color', atom_colors.get(atom.element, [0, 1, 1])),
-                                    Finish('phong', 0.3, 'reflection', 0.1))
             # Iterate through all the atom's bonds
             for bond in atom.bonds:
                 # In PDB files bonds are displayed twice. Once so A connects to B
@@ -294,9 +345,6 @@ class PDBMolecule(object):
                 # this simple if-statement prevents overlapping cylinders.
                 if bond > serial:
                     bond_atom = self.atoms[bond]
-                    # Declare a model that follows the bonded atom's styling guidelines
-                    stick_model_b = Texture(Pigment('color', atom_colors.get(bond_atom.element, [0, 1, 1])),
-                                    Finish('phong', 0.3, 'reflection', 0.1))
 
                     # Declare a vector to place the cylinder on
                     A = np.array([atom.x, atom.y, atom.z])
@@ -304,9 +352,20 @@ class PDBMolecule(object):
                     # Declare the midwaypoint so we can use bi-colored cylinders*
                     midpoint = (A + B) / 2
 
-                    stick_a = Cylinder(A, midpoint, scale / 3, stick_model_a)
-                    stick_b = Cylinder(midpoint, B, scale / 3, stick_model_b)
-                    sticks.extend((stick_a, stick_b))
+                    # Each half follows the styling guidelines of its own atom
+                    halves.append((A, midpoint, atom.element))
+                    halves.append((midpoint, B, bond_atom.element))
+
+        stick_finish = Finish('phong', 0.3, 'reflection', 0.1)
+        if self.batched:
+            texture_ids, textures = self._element_textures([h[2] for h in halves], stick_finish)
+            sticks = [CylinderArray([h[0] for h in halves], [h[1] for h in halves], scale / 3,
+                                    texture_ids, textures)]
+        else:
+            sticks = [Cylinder(start, end, scale / 3,
+                               Texture(Pigment('color', atom_colors.get(element, [0, 1, 1])),
+                                       stick_finish))
+                      for start, end, element in halves]
 
         # Update the rendering
         self._update_render()
@@ -322,12 +381,15 @@ class PDBMolecule(object):
         # Remove atoms from self
         for index in sorted(atoms, reverse=True):
             del self.atoms[index]
+        # Removing atoms may expose others
+        self._buried = None
 
         # Regenerate the reduced molecule
         self.render_molecule()
 
         # Return a new PDBMolecule
-        return PDBMolecule(name, center=False, offset=offset, atoms=molecule)
+        return PDBMolecule(name, center=False, offset=offset, atoms=molecule,
+                           batched=self.batched, surface_only=self.surface_only)
 
     def _calc_rotate(self, axis, theta, v):
         """ Calculates the new coordinates for a rotation
@@ -362,6 +424,47 @@ class PDBMolecule(object):
         return '{}{}\n{}\n'.format(header, '\n'.join(structure), footer)
 
 
+def buried_atoms(coordinates, radii, points=256, probe=1.4):
+    """ Returns a boolean array telling which of the given atoms (spheres) are buried,
+        i.e. cannot be touched by a probe sphere of radius 'probe' (a water molecule).
+
+        This is the Shrake-Rupley solvent accessibility test: 'points' points are spread
+        evenly over each atom grown by the probe radius, and an atom is buried when all of
+        them lie within its grown neighbours. Overlapping neighbours are found with a
+        k-d tree. Atoms only reachable through gaps narrower than the probe are buried
+        too, so a larger probe hides more atoms. """
+    coordinates = np.asarray(coordinates, dtype=float)
+    radii = np.asarray(radii, dtype=float) + probe
+    if len(radii) < 2:
+        return np.zeros(len(radii), dtype=bool)
+    covered = np.zeros((len(radii), points), dtype=bool)
+
+    # Points evenly spread over the unit sphere (Fibonacci lattice)
+    heights = 1 - (2 * np.arange(points) + 1) / points
+    angles = np.pi * (3 - np.sqrt(5)) * np.arange(points)
+    rings = np.sqrt(1 - heights ** 2)
+    unit_points = np.column_stack([rings * np.cos(angles), rings * np.sin(angles), heights])
+
+    # Pairs of overlapping atoms, in both directions, sorted by the covered atom
+    pairs = cKDTree(coordinates).query_pairs(2 * radii.max(), output_type='ndarray')
+    pairs = np.concatenate([pairs, pairs[:, ::-1]])
+    distances = norm(coordinates[pairs[:, 0]] - coordinates[pairs[:, 1]], axis=1)
+    pairs = pairs[distances < radii[pairs[:, 0]] + radii[pairs[:, 1]]]
+    pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+
+    # A point c_i + r_i * u lies within atom j if |c_i - c_j|^2 + 2 r_i (c_i - c_j).u
+    # + r_i^2 < r_j^2; pairs are processed in blocks to bound the memory use
+    for start in range(0, len(pairs), 2 ** 16):
+        i, j = pairs[start:start + 2 ** 16].T
+        offsets = coordinates[i] - coordinates[j]
+        inside = (2 * radii[i, None] * (offsets @ unit_points.T) <
+                  (radii[j] ** 2 - radii[i] ** 2 - (offsets ** 2).sum(axis=1))[:, None])
+        # Combine the points covered by all neighbours of each atom in the block
+        firsts = np.flatnonzero(np.r_[True, i[1:] != i[:-1]])
+        covered[i[firsts]] |= np.logical_or.reduceat(inside, firsts, axis=0)
+    return covered.all(axis=1)
+
+
 class PDBAtom(object):
     ''' Simple class to parse a single ATOM to retrieve x, y and z coordinates'''
     def __init__(self, string):
@@ -3,18 +3,57 @@ This module offers functionality to render a frame or movie given a
 Vapory 'Scene' object.
 """
 
+import asyncio
+import hashlib
+import json
 import shutil
 import sys
 import os
-from tempfile import mkdtemp
+import re
+from tempfile import mkdtemp, mkstemp, gettempdir
 from glob import glob
 from distutils import util
-from math import ceil
+from math import ceil, floor
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from moviepy.editor import ImageSequenceClip
 from pathos.multiprocessing import ProcessingPool as Pool
 import ffmpy
+from vapory import write_frames, LightSource, Radiosity, Photons, POVRayElement
+from vapory.geometry import Frustum, member_spheres
+from vapory.io import render_povfile
+from vapory.config import CHUNK_SIZE
 from pypovray import SETTINGS, logger
 
+# Reading and writing PNG images is only needed by the tiled and partial renders; older
+# imageio versions (as used by moviepy) have the same imread/imwrite functions
+try:
+    import imageio.v3 as imageio
+    imageio_found = True
+except ImportError:
+    try:
+        import imageio
+        imageio_found = True
+    except ImportError:
+        imageio_found = False
+
+# Scene features (keywords) through which a change in one object shows elsewhere in the image
+INDIRECT_LIGHT = re.compile(r'\b(reflection|refraction|ior|media|radiosity|photons)\b')
+
+# Data files read by a scene (see SphereArray.write_data), and the included files
+# (of the static objects, see _include_static_objects) searched for them
+DATA_FILE_PATTERN = re.compile(r'#fopen \w+ "([^"]+)" read')
+INCLUDE_PATTERN = re.compile(r'#include "([^"]+)"')
+
+# Render profiles (RenderProfile setting or --profile): image scale, Quality, AntiAlias and
+# maximum area light samples and radiosity count; 'final' renders as configured
+RENDER_PROFILES = {
+    'draft': dict(scale=0.25, quality=5, antialiasing=None, area_light=2, radiosity_count=20),
+    'preview': dict(scale=0.5, quality=9, antialiasing=0.3, area_light=4, radiosity_count=50),
+    'final': dict(),
+}
+
 
 def render_scene_to_png(frame, frame_id=0):
     """ Renders one or more frames given the `frame` function object and  a
@@ -25,15 +64,16 @@ def render_scene_to_png(frame, frame_id=0):
         if frame_id < 0 or frame_id > eval(SETTINGS.NumberFrames):
             logger.warning('["%s"] - Frame number(s) outside of range(0, %d)',
                            sys._getframe().f_code.co_name, eval(SETTINGS.NumberFrames))
-        _render_frame(frame(frame_id), frame_id)
+        _render_frame(frame(frame_id), frame_id, tmp_folder)
 
     elif isinstance(frame_id, (list, range)):
         if min(frame_id) < 0 or max(frame_id) > eval(SETTINGS.NumberFrames):
             logger.warning('["%s"] - Frame number(s) outside of range(0, %d)',
                            sys._getframe().f_code.co_name, eval(SETTINGS.NumberFrames))
 
+        previous = None
         for id in frame_id:
-            _render_frame(frame(id), id)
+            previous = _render_frame(frame(id), id, tmp_folder, previous)
     else:
         logger.error('["%s"] - Not simulating; given frame number(s) not of integer or list type.',
                      sys._getframe().f_code.co_name)
@@ -44,6 +84,60 @@ def render_scene_to_png(frame, frame_id=0):
         shutil.rmtree(tmp_folder)
 
 
+async def render_frames_async(frame, frame_ids, concurrency=None):
+    """ Coroutine rendering the frames given by the `frame` function object for each of
+    the frame numbers in `frame_ids`, within a single process using asyncio. Scenes are
+    built while POV-Ray renders previous frames, with at most `concurrency` (by default
+    the Workers setting) frames being built or rendered at any time.
+
+    If a frame fails, or the coroutine is cancelled, the renders still running are
+    stopped. Returns the list of rendered image files, in the order of `frame_ids`.
+
+    Example: asyncio.run(render_frames_async(frame, range(100), 8)) """
+    semaphore = asyncio.Semaphore(int(concurrency or SETTINGS.Workers))
+
+    async def render(frame_id):
+        async with semaphore:
+            frame_file = _create_frame_file_name(frame_id)
+            scene = _prepare_scene(frame(frame_id), frame_id)
+            scene, saved_lighting = _reuse_lighting(scene)
+            try:
+                result = await scene.render_async(frame_file, return_stats=True,
+                                                  **_render_options())
+            finally:
+                _keep_lighting(saved_lighting)
+            _record_render_stats(result[1], frame_id)
+            return frame_file
+
+    tasks = [asyncio.ensure_future(render(frame_id)) for frame_id in frame_ids]
+    try:
+        return await asyncio.gather(*tasks)
+    except Exception:
+        # When cancelled, gather() has already stopped the frames; not so when one fails
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def render_frames_batched(frame, frame_ids, workers=None):
+    """ Renders the frames of the `frame` function object for `frame_ids` with one POV-Ray
+    run per range of consecutive frames, in at most `workers` parallel parts """
+    tmp_folder = _create_tmp_folder()
+    parts = _frame_ranges(sorted(set(frame_ids)), int(workers or SETTINGS.Workers))
+    with ThreadPoolExecutor(len(parts) or 1) as executor:
+        renders = [executor.submit(_render_frame_ranges,
+                                   {frame_id: frame(frame_id) for frame_id in ids},
+                                   tmp_folder)
+                   for ids in parts]
+        for render in renders:
+            render.result()
+
+    if SETTINGS.LogLevel != "DEBUG" or util.strtobool(SETTINGS.RemoveTempFiles):
+        shutil.rmtree(tmp_folder)
+    return [_create_frame_file_name(frame_id) for frame_id in frame_ids]
+
+
 def render_scene_to_gif(scene, frame_ids=None):
     """ Creates a GIF output 'movie' using moviepy.
     NOTE: a GIF file has reduced quality compared to the rendered output!
@@ -109,7 +203,17 @@ def _render_scene(scene, frame_ids=None):
         id_list = range(nframes)
 
     # Render each scene using a thread pool or single-threaded
-    if util.strtobool(SETTINGS.UsePool):
+    if _setting_enabled('BatchFrames'):
+        render_frames_batched(scene, list(id_list))
+
+    elif util.strtobool(SETTINGS.UsePool) and _setting_enabled('PartialRender'):
+        # Each worker renders a range of frames, one after the other, so that every frame
+        # but the first of a range is rendered from the previous one
+        ranges = _frame_ranges(list(id_list), int(SETTINGS.workers))
+        with Pool(int(SETTINGS.workers)) as p:
+            p.map(render_scene_to_png, [scene] * len(ranges), ranges)
+
+    elif util.strtobool(SETTINGS.UsePool):
         scene_flist = [scene] * nframes
 
         # Render each scene, using a thread pool
@@ -117,8 +221,7 @@ def _render_scene(scene, frame_ids=None):
             p.map(render_scene_to_png, scene_flist, id_list)
 
     else:
-        for frame_id in id_list:
-            render_scene_to_png(scene, frame_id)
+        render_scene_to_png(scene, list(id_list))
 
 
 def _remove_folder_contents(folder, match=None):
@@ -136,26 +239,546 @@ def _remove_folder_contents(folder, match=None):
             print(e)
 
 
-def _render_frame(scene, frame_id):
-    """ Renders a single frame """
+def _render_frame(scene, frame_id, tmp_folder=None, previous=None):
+    """ Renders a single frame, writing the POV-Ray input file to the tmp_folder if given.
+    Returns the (scene, frame_id, texts) to pass as `previous` with the next frame """
     #logger.debug("Step %d, in seconds: %f.", frame_id, frame_id / eval(SETTINGS.NumberFrames))
+    region = None
+    texts = {}
+    if previous is not None and _setting_enabled('PartialRender'):
+        region = _changed_region((previous[0], previous[2]), scene, texts)
+    current = scene, frame_id, texts
     frame_file = _create_frame_file_name(frame_id)
-    scene.render(frame_file,
-                 width=SETTINGS.ImageWidth,
-                 height=SETTINGS.ImageHeight,
-                 antialiasing=SETTINGS.AntiAlias,
-                 show_window=util.strtobool(SETTINGS.ShowWindow),
-                 quality=SETTINGS.Quality,
-                 remove_temp=util.strtobool(SETTINGS.RemoveTempFiles))
+    scene = _prepare_scene(scene, frame_id)
+    pov_file = _create_pov_file_name(tmp_folder, frame_id)
+    if pov_file is None:
+        fd, pov_file = mkstemp(suffix='.pov')
+        os.close(fd)
+
+    scene, saved_lighting = _reuse_lighting(scene)
+    try:
+        with open(pov_file, 'w') as f:
+            _with_aspect(scene).write(f)
+        cache_file = None
+        if _setting_enabled('RenderCache'):
+            cache_file = _cache_file(pov_file, scene)
+            if os.path.exists(cache_file):
+                shutil.copyfile(cache_file, frame_file)
+                logger.debug('["%s"] - frame %s taken from the render cache (%s)',
+                             sys._getframe().f_code.co_name, frame_id, cache_file)
+                return current
+        if region is not None:
+            stats = _render_region(pov_file, frame_file, region,
+                                   _create_frame_file_name(previous[1]))
+        elif int(SETTINGS.TileRows or 1) * int(SETTINGS.TileColumns or 1) > 1:
+            stats = _render_tiled(pov_file, frame_file)
+        else:
+            options = _render_options()
+            _, stats = render_povfile(pov_file, frame_file, options['height'],
+                                      options['width'], options['quality'],
+                                      options['antialiasing'], options['show_window'],
+                                      options['includedirs'], return_stats=True)
+    finally:
+        _keep_lighting(saved_lighting)
+        if util.strtobool(SETTINGS.RemoveTempFiles):
+            os.remove(pov_file)
+    _record_render_stats(stats, frame_id)
+    if cache_file is not None:
+        tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        shutil.copyfile(frame_file, tmp_file)
+        os.replace(tmp_file, cache_file)
+    return current
+
+
+def _frame_ranges(frame_ids, count):
+    """ Splits the sorted frame numbers in at most `count` parts of similar length """
+    size = max(1, ceil(len(frame_ids) / max(count, 1)))
+    return [frame_ids[start:start + size] for start in range(0, len(frame_ids), size)]
+
+
+def _consecutive_runs(frame_ids):
+    """ Splits the sorted (integer) frame numbers in runs of consecutive numbers """
+    runs = []
+    for frame_id in frame_ids:
+        if runs and frame_id == runs[-1][-1] + 1:
+            runs[-1].append(frame_id)
+        else:
+            runs.append([frame_id])
+    return runs
+
+
+def _cache_file(pov_file, scene):
+    """ Returns the render cache file of the scene written to `pov_file`, named after a
+    hash of that file, the data files it reads and the render options """
+    digest = hashlib.sha1()
+    data_files = set()
+    tail = ''
+    with open(pov_file) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+            digest.update(chunk.encode())
+            # The previous chunk's tail is searched again for names split between chunks
+            data_files.update(DATA_FILE_PATTERN.findall(tail + chunk))
+            tail = chunk[-1024:]
+    static_text = ''.join(e for e in scene.static if isinstance(e, str))
+    for include_file in INCLUDE_PATTERN.findall(static_text):
+        if os.path.exists(include_file):
+            with open(include_file) as f:
+                data_files.update(DATA_FILE_PATTERN.findall(f.read()))
+    for data_file in sorted(data_files):
+        with open(data_file, 'rb') as f:
+            digest.update(f.read())
+    options = _render_options()
+    digest.update(json.dumps([options[key] for key in ('width', 'height', 'quality',
+                                                       'antialiasing')]).encode())
+    cache_dir = SETTINGS.CacheDir or os.path.join(gettempdir(), 'pypovray_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, '{}.png'.format(digest.hexdigest()))
+
+
+def _render_frame_ranges(scenes, tmp_folder):
+    """ Renders the scenes of a dict {frame number: Scene} with a single POV-Ray run per
+    range of consecutive frames """
+    for frame_ids in _consecutive_runs(sorted(scenes)):
+        if len(frame_ids) == 1:
+            # POV-Ray only numbers the output of animations of more than one frame
+            _render_frame(scenes[frame_ids[0]], frame_ids[0], tmp_folder)
+            continue
+        first, last = frame_ids[0], frame_ids[-1]
+        name = os.path.join(tmp_folder, 'frames_{}_{}'.format(first, last))
+        write_frames({frame_id: _with_aspect(_prepare_scene(scenes[frame_id], frame_id))
+                      for frame_id in frame_ids}, name + '.pov')
+
+        options = _render_options()
+        _, stats = render_povfile(name + '.pov', name + '_.png', options['height'],
+                                  options['width'], options['quality'],
+                                  options['antialiasing'], options['show_window'],
+                                  options['includedirs'],
+                                  options=['+KFI{}'.format(first), '+KFF{}'.format(last)],
+                                  return_stats=True)
+        _record_render_stats(stats, first, last)
+
+        # POV-Ray appends the frame number, padded to the length of the last one
+        for image in glob(name + '_*.png'):
+            frame_id = int(re.search(r'_(\d+)\.png$', image).group(1))
+            shutil.move(image, _create_frame_file_name(frame_id))
+        logger.debug('["%s"] - rendered frames %d to %d in a single POV-Ray run',
+                     sys._getframe().f_code.co_name, first, last)
+
+
+def _with_aspect(scene):
+    """ The scene with the camera's right vector set to the aspect ratio of the images,
+    as done by Scene.render, for scenes written to file here """
+    return scene.set_camera(scene.camera.add_args(
+        ['right', [_aspect(), 0, 0]]))
+
+
+def _prepare_scene(scene, frame_id):
+    """ Applies the render profile and the scene optimizations enabled in the settings to
+    the scene of a frame """
+    scene = _apply_render_profile(scene)
+    if _setting_enabled('FrustumCulling'):
+        # Static objects written inline need not stay the same between frames
+        scene = scene.cull(aspect=_aspect(), static=not _setting_enabled('StaticInclude'))
+    if _setting_enabled('InstanceObjects'):
+        scene = scene.instance_objects()
+    if _setting_enabled('BoundingHierarchy'):
+        scene = scene.bound()
+    if _setting_enabled('HoistDeclares'):
+        scene = scene.hoist_declares()
+    if scene.static and _setting_enabled('StaticInclude'):
+        scene = _include_static_objects(scene)
+    if _setting_enabled('SceneProfile'):
+        _write_scene_profile(scene, frame_id)
+    return scene
+
+
+def _render_options():
+    """ The image size and quality options of Scene.render given by the settings and the
+    render profile """
+    profile = _render_profile()
+    scale = profile.get('scale', 1)
+    antialiasing = SETTINGS.AntiAlias
+    if 'antialiasing' in profile:
+        # A profile never renders slower than the settings: a higher threshold is faster
+        antialiasing = profile['antialiasing'] and max(profile['antialiasing'], antialiasing)
+    return dict(width=max(1, round(SETTINGS.ImageWidth * scale)),
+                height=max(1, round(SETTINGS.ImageHeight * scale)),
+                antialiasing=antialiasing,
+                show_window=util.strtobool(SETTINGS.ShowWindow),
+                quality=min(profile.get('quality', SETTINGS.Quality), SETTINGS.Quality),
+                includedirs=[_static_dir()])
+
+
+def _aspect():
+    """ The aspect ratio of the rendered images """
+    options = _render_options()
+    return options['width'] / options['height']
+
+
+def _render_profile():
+    """ The render profile (see RENDER_PROFILES) named by the RenderProfile setting """
+    name = SETTINGS.RenderProfile or 'final'
+    if name not in RENDER_PROFILES:
+        raise ValueError("Unknown render profile '{}', use one of: {}".format(
+            name, ', '.join(RENDER_PROFILES)))
+    return RENDER_PROFILES[name]
+
+
+def _apply_render_profile(scene):
+    """ The scene with the area light samples and radiosity count limited by the
+    render profile """
+    profile = _render_profile()
+    if 'area_light' not in profile and 'radiosity_count' not in profile:
+        return scene
+
+    def keyword_index(args, keyword):
+        # Compared to the strings only, as arguments can be numpy arrays
+        return next((i for i, a in enumerate(args) if isinstance(a, str) and a == keyword),
+                    None)
+
+    def light(e):
+        index = keyword_index(e.args, 'area_light') if isinstance(e, LightSource) else None
+        if index is None:
+            return e
+        args = list(e.args)
+        # area_light <axis1>, <axis2>, size1, size2
+        for i in (index + 3, index + 4):
+            if i < len(args) and isinstance(args[i], (int, float)):
+                args[i] = min(args[i], profile.get('area_light', args[i]))
+        return e._with_args(args)
+
+    def radiosity(e):
+        index = keyword_index(e.args, 'count') if isinstance(e, Radiosity) else None
+        if index is None:
+            return e
+        args = list(e.args)
+        index += 1
+        if index < len(args) and isinstance(args[index], (int, float)):
+            args[index] = min(args[index], profile.get('radiosity_count', args[index]))
+        return e._with_args(args)
+
+    scene = scene.copy()
+    scene.objects = [light(e) for e in scene.objects]
+    scene.static = [light(e) for e in scene.static]
+    scene.global_settings = [radiosity(e) for e in scene.global_settings]
+    return scene
+
+
+def _render_tiled(pov_file, frame_file):
+    """ Renders `pov_file` as TileRows x TileColumns tiles in parallel and stitches them
+    into `frame_file`. Returns the render statistics summed over the tiles """
+    if not imageio_found:
+        raise IOError("Tiled rendering (TileRows/TileColumns) requires imageio installed.")
+    options = _render_options()
+    width, height = int(options['width']), int(options['height'])
+
+    rows = np.linspace(0, height, int(SETTINGS.TileRows or 1) + 1).astype(int)
+    columns = np.linspace(0, width, int(SETTINGS.TileColumns or 1) + 1).astype(int)
+    tiles = [(top, bottom, left, right)
+             for top, bottom in zip(rows[:-1], rows[1:]) if bottom > top
+             for left, right in zip(columns[:-1], columns[1:]) if right > left]
+
+    def render_tile(tile):
+        image, stats = render_povfile(pov_file, None, height, width, options['quality'],
+                                      options['antialiasing'],
+                                      includedirs=options['includedirs'],
+                                      options=_region_options(tile, height, width),
+                                      return_stats=True)
+        return _crop_region(image, tile, height, width), stats
+
+    with ThreadPoolExecutor(int(SETTINGS.Workers)) as executor:
+        images, tile_stats = zip(*executor.map(render_tile, tiles))
+
+    frame = np.zeros((height, width, 3), dtype=images[0].dtype)
+    for (top, bottom, left, right), image in zip(tiles, images):
+        frame[top:bottom, left:right] = image
+    imageio.imwrite(frame_file, frame)
+    return _sum_render_stats(tile_stats)
+
+
+def _region_options(region, height, width):
+    """ The POV-Ray options rendering only the (top, bottom, left, right) region of the
+    image, in pixels from the top left corner (bottom and right excluded) """
+    top, bottom, left, right = region
+    # Pixel numbers start at 1; the image borders are left to the defaults, as
+    # POV-Ray reads values up to 1.0 as fractions of the image size
+    return ['{}{}'.format(option, value)
+            for option, value, border in (('+SR', top + 1, top == 0),
+                                          ('+ER', bottom, bottom == height),
+                                          ('+SC', left + 1, left == 0),
+                                          ('+EC', right, right == width))
+            if not border]
+
+
+def _crop_region(image, region, height, width):
+    """ The region of a partial render; depending on the version, POV-Ray writes
+    either the whole image or the region only """
+    top, bottom, left, right = region
+    if image.shape[0] == height:
+        image = image[top:bottom]
+    if image.shape[1] == width:
+        image = image[:, left:right]
+    return image
+
+
+def _changed_region(previous, scene, texts):
+    """ Returns the (top, bottom, left, right) pixel region where the scene differs from
+    the `previous` (scene, texts), or None if the whole image must be rendered again """
+    previous, previous_texts = previous
+    for field in ('camera', 'included', 'defaults', 'declares', 'static',
+                  'atmospheric', 'global_settings'):
+        if getattr(previous, field) is getattr(scene, field):
+            if field in previous_texts:
+                texts.setdefault(field, previous_texts[field])
+        elif _entry_texts(previous, previous_texts, field) != _entry_texts(scene, texts, field):
+            return None
+
+    old = list(zip(_entry_texts(previous, previous_texts, 'objects'), previous.objects))
+    new = list(zip(_entry_texts(scene, texts, 'objects'), scene.objects))
+    old_texts, new_texts = Counter(t for t, _ in old), Counter(t for t, _ in new)
+    changed = ([e for t, e in old if t not in new_texts] +
+               [e for t, e in new if t not in old_texts])
+    if not changed:
+        return 0, 0, 0, 0
+
+    texts = [t for t, _ in new] + _entry_texts(scene, texts, 'static')
+    lights = [t for t in texts if t.startswith('light_source')]
+    if any(isinstance(e, LightSource) or not isinstance(e, POVRayElement) for e in changed):
+        return None
+    if any(INDIRECT_LIGHT.search(t) for t in texts):
+        return None
+    if any('shadowless' not in t for t in lights) and \
+            any('no_shadow' not in str(e) for e in changed):
+        return None
+
+    frustum = Frustum.from_camera(scene.camera, _aspect())
+    spheres = [member_spheres(e) for e in changed]
+    if frustum is None or any(s is None for s in spheres):
+        return None
+    box = frustum.screen_box(np.concatenate([s[0] for s in spheres]),
+                             np.concatenate([s[1] for s in spheres]))
+    if box is None:
+        return None
+    options = _render_options()
+    width, height = int(options['width']), int(options['height'])
+    # Widened by a pixel for antialiasing
+    left, right = max(0, floor(box[0] * width) - 1), min(width, ceil(box[1] * width) + 1)
+    top, bottom = max(0, floor(box[2] * height) - 1), min(height, ceil(box[3] * height) + 1)
+    if right <= left or bottom <= top:
+        return 0, 0, 0, 0
+    return top, bottom, left, right
+
+
+def _listed(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+
+def _entry_texts(scene, texts, field):
+    """ The POV-Ray texts of the entries of a field of the scene, kept in the `texts` dict
+    so that each is only serialized once """
+    if field not in texts:
+        texts[field] = [str(e) for e in _listed(getattr(scene, field))]
+    return texts[field]
+
+
+def _render_region(pov_file, frame_file, region, previous_file):
+    """ Renders the region of the frame written to `pov_file` (see _changed_region) and
+    pastes it onto the image of the previous frame. Returns the render statistics. """
+    top, bottom, left, right = region
+    if bottom <= top:
+        shutil.copyfile(previous_file, frame_file)
+        return {}
+    if not imageio_found:
+        raise IOError("PartialRender requires imageio installed.")
+    options = _render_options()
+    width, height = int(options['width']), int(options['height'])
+    image, stats = render_povfile(pov_file, None, height, width, options['quality'],
+                                  options['antialiasing'],
+                                  includedirs=options['includedirs'],
+                                  options=_region_options(region, height, width),
+                                  return_stats=True)
+    frame = np.array(imageio.imread(previous_file))
+    frame[top:bottom, left:right] = _crop_region(image, region, height, width)
+    imageio.imwrite(frame_file, frame)
+    logger.debug('["%s"] - rendered rows %d-%d, columns %d-%d of %s',
+                 sys._getframe().f_code.co_name, top, bottom, left, right, frame_file)
+    return stats
+
+
+def _sum_render_stats(stats_list):
+    """ Sums the numbers in a list of render statistics (see vapory.io.parse_povray_stats) """
+    total = {}
+    for stats in stats_list:
+        for group, values in stats.items():
+            for key, value in values.items():
+                if isinstance(value, tuple):
+                    value = list(value)
+                previous = total.setdefault(group, {}).get(key)
+                if previous is None:
+                    total[group][key] = value
+                elif isinstance(value, list):
+                    total[group][key] = [a + b for a, b in zip(previous, value)]
+                elif isinstance(value, (int, float)):
+                    total[group][key] = previous + value
+    return total
+
+
+def _include_static_objects(scene):
+    """ Writes the static objects of the scene to an include file, named after a hash of
+    its contents, and returns the scene including it instead """
+    digest = hashlib.sha1()
+    for chunk in scene.iter_static_chunks():
+        digest.update(chunk.encode())
+    include_file = os.path.join(_static_dir(), 'static_{}.inc'.format(digest.hexdigest()[:16]))
+
+    if not os.path.exists(include_file):
+        logger.debug('["%s"] - writing static objects to %s',
+                     sys._getframe().f_code.co_name, include_file)
+        tmp_file = '{}.{}.tmp'.format(include_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            scene.write_static(f)
+        os.replace(tmp_file, include_file)
+
+    return scene.include_static(include_file)
+
+
+def _reuse_lighting(scene):
+    """ Makes the scene load the radiosity and photon data of its segment, or save it if
+    missing. Returns the scene and the (temporary, final) names of the files it saves """
+    if not _setting_enabled('ReuseLighting'):
+        return scene, []
+    kinds = [(kind, extension) for kind, extension in ((Radiosity, 'rad'), (Photons, 'ph'))
+             if any(isinstance(e, kind) for e in scene.global_settings)]
+    if not kinds:
+        return scene, []
+
+    digest = hashlib.sha1()
+    for chunk in scene.iter_static_chunks():
+        digest.update(chunk.encode())
+    for e in scene.objects + scene.global_settings:
+        if isinstance(e, (LightSource, Radiosity, Photons)):
+            digest.update(str(e).encode())
+    name = os.path.join(_static_dir(), 'lighting_{}'.format(digest.hexdigest()[:16]))
+    files = {kind: '{}.{}'.format(name, extension) for kind, extension in kinds}
+
+    if all(os.path.exists(data_file) for data_file in files.values()):
+        # A single pretrace pass, as the loaded samples already cover the scene
+        load = {Radiosity: ['load_file', '"{}"', 'always_sample', 'off',
+                            'pretrace_start', '1', 'pretrace_end', '1'],
+                Photons: ['load_file', '"{}"']}
+        return _lighting_settings(scene, files, load), []
+    try:
+        # Claims the warm-up; only the first frame of the segment saves the data
+        os.close(os.open(name + '.lock', os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return scene, []
+    logger.debug('["%s"] - saving radiosity/photon data to %s.*',
+                 sys._getframe().f_code.co_name, name)
+    tmp_files = {kind: '{}.{}.tmp'.format(os.path.basename(data_file), os.getpid())
+                 for kind, data_file in files.items()}
+    save = {Radiosity: ['save_file', '"{}"'], Photons: ['save_file', '"{}"']}
+    return (_lighting_settings(scene, tmp_files, save),
+            [(tmp_files[kind], files[kind]) for kind in files] + [(None, name + '.lock')])
+
+
+def _lighting_settings(scene, files, args):
+    """ The scene with the `args` (with the file name filled in) added to its Radiosity
+    and Photons global settings """
+    scene = scene.copy()
+    scene.global_settings = [
+        e.add_args([arg.format(files[type(e)]) for arg in args[type(e)]])
+        if type(e) in files else e for e in scene.global_settings]
+    return scene
+
+
+def _keep_lighting(saved):
+    """ Moves the radiosity and photon data saved by a render (see _reuse_lighting) to
+    the names later frames load them from """
+    data_files = [(tmp_file, data_file) for tmp_file, data_file in saved if tmp_file]
+    complete = all(os.path.exists(tmp_file) for tmp_file, _ in data_files)
+    for tmp_file, data_file in data_files:
+        if complete:
+            # Moved next to its final name first, as the folders may be on other disks
+            shutil.move(tmp_file, data_file + '.part')
+            os.replace(data_file + '.part', data_file)
+        elif os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    if saved and not complete:
+        os.remove(saved[-1][1])
+
+
+def _write_scene_profile(scene, frame_id):
+    """ Writes the complexity statistics of the scene (see Scene.profile) as a JSON
+    report named after the frame (see _report_file) """
+    report = scene.profile()
+    report['frame'] = frame_id
+    report_file = _report_file(frame_id)
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=1)
+    logger.debug('["%s"] - frame %s: %d bytes serialized in %.3fs, written to %s',
+                 sys._getframe().f_code.co_name, frame_id, report['serialization']['bytes'],
+                 report['serialization']['seconds'], report_file)
+
+
+def _record_render_stats(stats, frame_id, last_frame_id=None):
+    """ Logs the slowest render phase of the frames frame_id to last_frame_id and, with
+    the RenderStats setting, writes the render statistics to a JSON report """
+    frames = frame_id if last_frame_id is None else '{}-{}'.format(frame_id, last_frame_id)
+    times = stats.get('times', {})
+    if times:
+        slowest = max(times, key=times.get)
+        logger.debug('["%s"] - frame %s: %s-bound (%.3fs of %.3fs)',
+                     sys._getframe().f_code.co_name, frames, slowest, times[slowest],
+                     sum(times.values()))
+    if _setting_enabled('RenderStats'):
+        report = dict(stats, frame=frame_id)
+        suffix = '_stats'
+        if last_frame_id is not None:
+            report['last_frame'] = last_frame_id
+            suffix = '_to_{}_stats'.format(str(round(last_frame_id, 2)).zfill(3))
+        with open(_report_file(frame_id, suffix), 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+def _report_file(frame_id, suffix=''):
+    """ Returns the name of a JSON report on the frame in the ReportDir setting if
+    given, otherwise in a 'reports' folder (created) next to the images folder """
+    report_dir = SETTINGS.ReportDir or os.path.join(os.path.dirname(
+        os.path.normpath(SETTINGS.OutputImageDir)), 'reports')
+    os.makedirs(report_dir, exist_ok=True)
+    return os.path.join(report_dir, '{}_{}{}.json'.format(
+        SETTINGS.OutputPrefix, str(round(frame_id, 2)).zfill(3), suffix))
+
+
+def _static_dir():
+    """ Returns the (created) folder for the static object include files; the StaticDir
+    setting if given, otherwise a folder in the system temp directory """
+    static_dir = SETTINGS.StaticDir or os.path.join(gettempdir(), 'pypovray_static')
+    os.makedirs(static_dir, exist_ok=True)
+    return static_dir
+
+
+def _setting_enabled(setting):
+    """ Returns True if the given boolean setting is present and switched on,
+    settings missing from older configuration files count as off """
+    value = getattr(SETTINGS, setting)
+    return bool(value) and bool(util.strtobool(str(value)))
 
 
 def _create_tmp_folder():
     tmp_folder = mkdtemp()
-    os.chdir(tmp_folder)
     logger.debug('["%s"] - tmp_folder: %s', sys._getframe().f_code.co_name, tmp_folder)
     return tmp_folder
 
 
+def _create_pov_file_name(tmp_folder, frame):
+    """ Name of the POV-Ray input file of a frame in the tmp_folder, or None to let
+    vapory pick a unique name """
+    if tmp_folder is None:
+        return None
+    return os.path.join(tmp_folder, 'frame_{}.pov'.format(str(round(frame, 2)).zfill(3)))
+
+
 def _create_frame_file_name(frame):
     output_file = '{}/{}_{}.png'.format(SETTINGS.OutputImageDir,
                                         SETTINGS.OutputPrefix, str(round(frame, 2)).zfill(3))
@@ -0,0 +1,27 @@
+""" Tests of the buried atom test of pypovray.pdb """
+
+import numpy as np
+from pypovray.pdb import PDBMolecule, buried_atoms
+
+
+def test_enclosed_atom_is_buried():
+    # An atom in the middle of six larger atoms on the axes, and one far away
+    coordinates = np.array([[0, 0, 0], [1, 0, 0], [-1, 0, 0], [0, 1, 0],
+                            [0, -1, 0], [0, 0, 1], [0, 0, -1], [10, 0, 0]])
+    radii = [0.5, 1, 1, 1, 1, 1, 1, 1]
+    buried = buried_atoms(coordinates, radii, probe=0)
+    assert buried.tolist() == [True] + [False] * 7
+
+
+def test_probe_buries_atoms_behind_narrow_gaps():
+    # A small atom in the groove between two touching atoms
+    coordinates = np.array([[0, 0.3, 0], [1, 0, 0], [-1, 0, 0]])
+    radii = [0.35, 1, 1]
+    assert not buried_atoms(coordinates, radii, probe=0).any()
+    assert buried_atoms(coordinates, radii, probe=1.4).tolist() == [True, False, False]
+
+
+def test_buried_atoms_of_protein():
+    molecule = PDBMolecule('pdb/6iev.pdb', surface_only=True, batched=True)
+    assert 0 < molecule._buried.sum() < len(molecule.atoms)
+    assert len(molecule.povray_molecule[0].centers) == (~molecule._buried).sum()
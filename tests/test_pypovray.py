@@ -0,0 +1,41 @@
+""" Tests of the helper functions of pypovray.pypovray """
+
+from vapory import Scene, Camera
+from pypovray import pypovray
+
+
+def test_frame_ranges():
+    frame_ids = [0, 1, 2, 3, 4, 9, 10, 20, 21]
+    for count in range(1, 12):
+        parts = pypovray._frame_ranges(frame_ids, count)
+        assert len(parts) <= count
+        assert [f for part in parts for f in part] == frame_ids
+    assert pypovray._frame_ranges(list(range(10)), 3) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert pypovray._frame_ranges([], 3) == []
+
+
+def test_consecutive_runs():
+    assert pypovray._consecutive_runs([0, 1, 2, 5, 7, 8]) == [[0, 1, 2], [5], [7, 8]]
+
+
+def test_cache_file_key(tmp_path, monkeypatch):
+    monkeypatch.setitem(pypovray.SETTINGS.overrides, 'CacheDir', str(tmp_path))
+    data_file = tmp_path / 'atoms.csv'
+    scene = Scene(Camera(), [])
+
+    def key(text):
+        pov_file = tmp_path / 'frame.pov'
+        pov_file.write_text(text)
+        return pypovray._cache_file(str(pov_file), scene)
+
+    text = '#fopen Data "{}" read\nsphere {{ 0, 1 }}\n'.format(data_file)
+    data_file.write_text('0,0,0,1\n')
+    first = key(text)
+    assert first.startswith(str(tmp_path))
+    assert key(text) == first
+    assert key(text.replace('1 }', '2 }')) != first
+    data_file.write_text('0,0,0,2\n')
+    assert key(text) != first
+    data_file.write_text('0,0,0,1\n')
+    monkeypatch.setitem(pypovray.SETTINGS.overrides, 'ImageWidth', '13')
+    assert key(text) != first
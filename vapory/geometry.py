@@ -0,0 +1 @@
+vapory/geometry.py
\ No newline at end of file
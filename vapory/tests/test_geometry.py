@@ -0,0 +1,75 @@
+""" Tests of the view frustum culling and bounding hierarchy of vapory.geometry """
+
+from vapory.vapory import (Scene, Camera, LightSource, Sphere, Cylinder, Plane,
+                           Union, BoundedBy, SphereArray)
+from vapory.vapory.geometry import bounding_hierarchy
+
+
+def membrane(size=5, amount=10):
+    """ Two rows of spheres with cylinder tails along the x axis, as the membrane of
+    the schematic view of eindopdracht.py """
+    objects = []
+    for index in range(amount):
+        for x in (index * size * 2, -index * size * 2):
+            for y, tail in ((0, -size * 2.5), (-size * 6, size * 2.5)):
+                objects.append(Sphere([x, y, 0], size))
+                objects.append(Cylinder([x, y, 0], [x, y + tail, 0], size / 6))
+    return objects
+
+
+def zoom_camera(frame):
+    """ The camera of the zoom of frames 120-180 of eindopdracht.py """
+    x, y, z = [start + (frame - 120) * (end - start) / 60
+               for start, end in zip([0, 7, -200], [-20, 20, 3])]
+    return Camera('location', [x, y, z], 'look_at', [x, y, z + 1])
+
+
+def test_cull_static_objects():
+    static = [LightSource([0, -10, -60], 0.5)] + membrane()
+    scene = Scene(zoom_camera(170), static=static)
+    assert scene.cull(aspect=4 / 3).static == static
+    culled = scene.cull(aspect=4 / 3, static=True).static
+    assert static[0] in culled
+    assert 1 < len(culled) < len(static)
+    assert Scene(zoom_camera(180), static=static).cull(aspect=4 / 3, static=True).static == static[:1]
+
+
+def leaves(node, leaf_size, box=None):
+    """ The objects under a union of bounding_hierarchy, checking that each box
+    encloses the boxes of its children and that leaves are small enough """
+    *children, bound = node.args
+    assert isinstance(bound, BoundedBy)
+    low, high = bound.args[0].corner1, bound.args[0].corner2
+    if box is not None:
+        assert all(a <= b for a, b in zip(box[0], low))
+        assert all(a >= b for a, b in zip(box[1], high))
+    if not isinstance(children[0], Union):
+        assert len(children) <= leaf_size
+    found = []
+    for child in children:
+        if isinstance(child, Union):
+            found += leaves(child, leaf_size, (low, high))
+        else:
+            if isinstance(child, Sphere):
+                assert all(l <= c - child.radius and c + child.radius <= h
+                           for l, c, h in zip(low, child.center, high))
+            found.append(child)
+    return found
+
+
+def test_bounding_hierarchy():
+    plane = Plane([0, 1, 0], -10)
+    spheres = [Sphere([x, (x * 7) % 11, 0], 0.5) for x in range(100)]
+    assert bounding_hierarchy([plane] + spheres[:8], leaf_size=8) == [plane] + spheres[:8]
+    tree = bounding_hierarchy([plane] + spheres, leaf_size=8)
+    assert tree[0] is plane and len(tree) == 2
+    assert sorted(map(id, leaves(tree[1], 8))) == sorted(map(id, spheres))
+
+
+def test_bounding_hierarchy_splits_batches():
+    batch = SphereArray([[x, 0, 0] for x in range(40)], [0.5] * 40)
+    scene = Scene(Camera('location', [0, 0, -10]), objects=[batch]).bound(leaf_size=10)
+    members = leaves(scene.objects[0], 10)
+    assert all(isinstance(member, SphereArray) for member in members)
+    assert sorted(sum((list(map(tuple, m.centers)) for m in members), [])) == \
+        [(x, 0, 0) for x in range(40)]
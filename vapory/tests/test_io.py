@@ -0,0 +1,71 @@
+""" Tests of the parsing of POV-Ray's output in vapory.io """
+
+from vapory.io import parse_povray_stats
+
+# Standard error of POV-Ray 3.7 rendering an 800x600 scene
+POVRAY_37_STDERR = b"""\
+Persistence of Vision(tm) Ray Tracer Version 3.7.0.unofficial (g++ 7 @
+ x86_64-pc-linux-gnu)
+==== [Parsing...] ==========================================================
+----------------------------------------------------------------------------
+Parser Statistics
+----------------------------------------------------------------------------
+Finite Objects:            2
+Infinite Objects:          1
+Light Sources:             1
+Total:                     4
+----------------------------------------------------------------------------
+Parser Time
+  Parse Time:       0 hours  0 minutes  0 seconds (0.002 seconds)
+              using 1 thread(s) with 0.001 CPU-seconds total
+  Bounding Time:    0 hours  0 minutes  0 seconds (0.000 seconds)
+              using 1 thread(s) with 0.000 CPU-seconds total
+----------------------------------------------------------------------------
+Render Options
+  Quality:  9
+  Bounding boxes.......On   Bounding threshold: 3
+  Antialiasing.........Off
+==== [Rendering...] ========================================================
+----------------------------------------------------------------------------
+Render Statistics
+Image Resolution 800 x 600
+----------------------------------------------------------------------------
+Pixels:           480000   Samples:          480000   Smpls/Pxl: 1.00
+Rays:             960834   Saved:                 0   Max Level: 2/5
+----------------------------------------------------------------------------
+Ray->Shape Intersection          Tests       Succeeded  Percentage
+----------------------------------------------------------------------------
+Plane                          2884034         996180     34.54
+Sphere                         2884034         460474     15.97
+Bounding Box                   7210085        3017920     41.86
+----------------------------------------------------------------------------
+Shadow Ray Tests:          1218584   Succeeded:            168146
+Shadow Cache Hits:          297014
+----------------------------------------------------------------------------
+----------------------------------------------------------------------------
+Render Time:
+  Photon Time:      No photons
+  Radiosity Time:   No radiosity
+  Trace Time:       0 hours  0 minutes  1 seconds (0.741 seconds)
+              using 8 thread(s) with 5.221 CPU-seconds total
+POV-Ray finished
+"""
+
+
+def test_parse_povray_37_stats():
+    stats = parse_povray_stats(POVRAY_37_STDERR)
+    assert stats['times'] == {'parse': 0.002, 'bounding': 0.0, 'trace': 0.741}
+    assert stats['cpu_times'] == {'parse': 0.001, 'bounding': 0.0, 'trace': 5.221}
+    assert stats['counts'] == {'pixels': 480000, 'samples': 480000,
+                               'smpls_pxl': 1.0, 'rays': 960834, 'saved': 0,
+                               'max_level': '2/5', 'shadow_ray_tests': 1218584,
+                               'shadow_ray_tests_succeeded': 168146,
+                               'shadow_cache_hits': 297014}
+    assert stats['intersections'] == {'Plane': (2884034, 996180),
+                                      'Sphere': (2884034, 460474),
+                                      'Bounding Box': (7210085, 3017920)}
+
+
+def test_parse_no_stats():
+    assert parse_povray_stats(b'') == dict(times={}, cpu_times={}, counts={},
+                                           intersections={})
@@ -0,0 +1,45 @@
+""" Tests of the serialization of scene elements in vapory.vapory """
+
+import sys
+from vapory.vapory import Sphere, Texture, Pigment, Union
+
+
+def test_cached_text_follows_changes():
+    texture = Texture(Pigment('color', [1, 0, 0]))
+    sphere = Sphere([0, 0, 0], 1, texture)
+    first = str(Union(sphere))
+    # Serialized a second time: written from the cache
+    assert str(Union(sphere)) == first
+    assert str(Union(sphere)) == first
+    sphere.radius = 2
+    assert str(Union(sphere)) == first.replace('\n1\n', '\n2\n')
+    texture.args[0].args.append('filter')
+    texture.args[0].args.append(0.5)
+    assert 'filter\n0.5' in str(Union(sphere))
+    sphere.args = [[0, 0, 0], 3]
+    assert 'texture' not in str(Union(sphere))
+
+
+def test_serialized_elements_stay_small():
+    sphere = Sphere([0, 0, 0], 1)
+    assert not sphere.args.serialized
+    size = sys.getsizeof(sphere) + sys.getsizeof(sphere.args)
+    str(Union(sphere))
+    str(Union(sphere))
+    assert sys.getsizeof(sphere) + sys.getsizeof(sphere.args) == size
+    assert not hasattr(sphere, '__dict__')
+    assert not hasattr(sphere.args, '__dict__')
+    assert sphere.args.serialized
+
+
+def test_write_frames(tmp_path):
+    from vapory.vapory import Scene, Camera, write_frames
+    scenes = {i: Scene(Camera('location', [0, 0, -5], 'look_at', [0, 0, 0]),
+                       [Sphere([i, 0, 0], 1)]) for i in (3, 4)}
+    filename = str(tmp_path / 'frames.pov')
+    frame_files = write_frames(scenes, filename)
+    assert frame_files == [str(tmp_path / 'frames_3.pov'), str(tmp_path / 'frames_4.pov')]
+    for frame_file, scene in zip(frame_files, scenes.values()):
+        assert open(frame_file).read() == str(scene)
+    assert open(filename).read() == ('#include concat("%s_", str(frame_number, 0, 0), ".pov")\n'
+                                     % (tmp_path / 'frames'))
@@ -2,6 +2,14 @@ import os
 
 POVRAY_BINARY = ("povray.exe" if os.name=='nt' else "povray")
 
+# Approximate size (in characters) of the pieces in which scenes are streamed
+# to files and pipes, see Scene.iter_chunks
+CHUNK_SIZE = 2**16
+
+# Significant digits used when formatting whole arrays of numbers at once,
+# see helpers.format_rows. Plain Python numbers are still written by str()
+FLOAT_PRECISION = 8
+
 GLOBAL_SCENE_SETTINGS = {
     "charset"        : "ascii",
     "adc_bailout"    : "1/255",
@@ -0,0 +1,408 @@
+""" Bounding volumes of POV-Ray objects, and the view volume of cameras, to
+leave out of a scene the objects which cannot be seen, or to help POV-Ray
+with a hierarchy of bounding boxes.
+
+Bounds are only computed for the objects and transformations that can be
+read from their arguments (numbers and vectors, not POV-Ray identifiers or
+expressions). Anything else counts as unbounded, and is never culled.
+"""
+
+from .vapory import (POVRayElement, Sphere, Box, Cone, Cylinder, Union,
+                     Merge, Intersection, Difference, BoundedBy, ClippedBy,
+                     Photons, SphereArray, CylinderArray, Object,
+                     HOISTABLE_MODIFIERS)
+
+try:
+    import numpy
+    numpy_found=True
+except ImportError:
+    numpy_found=False
+
+# Arguments of objects that do not change their shape, or only shrink it
+NON_GEOMETRIC = HOISTABLE_MODIFIERS + (BoundedBy, ClippedBy, Photons)
+
+# Transformations whose effect on the bounds is computed
+TRANSFORMS = ('translate', 'rotate', 'scale')
+
+# Camera types other than 'perspective', which cannot be culled for
+CAMERA_TYPES = ('orthographic', 'fisheye', 'ultra_wide_angle', 'omnimax',
+                'panoramic', 'cylinder', 'spherical', 'mesh_camera')
+
+# POV-Ray's default camera
+DEFAULT_CAMERA = {'location': [0, 0, 0], 'direction': [0, 0, 1],
+                  'up': [0, 1, 0], 'right': [1.33, 0, 0], 'sky': [0, 1, 0]}
+
+
+def bounding_sphere(obj, instances=None):
+    """ Returns (center, radius) of a sphere enclosing the POV-Ray object
+    `obj` (center as an array of 3 floats), or None if the object is
+    unbounded or of unknown size.
+
+    Handles Sphere, Box, Cone, Cylinder, the CSG objects made of them, and
+    SphereArray/CylinderArray batches, transformed by translate, rotate and
+    scale. `object { Name ... }` instances are resolved through the dict
+    `instances` {Name: declared object} (see Scene.instance_objects). """
+    if not numpy_found:
+        raise IOError("Function bounding_sphere requires numpy installed.")
+    spheres = member_spheres(obj, instances)
+    if spheres is None or not len(spheres[0]):
+        return None
+    return _enclosing_sphere(*spheres)
+
+
+def member_spheres(obj, instances=None):
+    """ Returns (centers, radii), arrays of shape (N, 3) and (N,), of spheres
+    enclosing the N members of a SphereArray or CylinderArray, or the object
+    itself (N=1) for other objects. Returns None if unbounded. See
+    bounding_sphere for the `instances`. """
+    if not numpy_found:
+        raise IOError("Function member_spheres requires numpy installed.")
+    if isinstance(obj, Object):
+        name = obj.args[0] if obj.args else None
+        if not isinstance(name, str) or name not in (instances or {}):
+            return None
+        spheres = member_spheres(instances[name], instances)
+        if spheres is None:
+            return None
+        return _transform_spheres(*spheres, obj.args[1:])
+    if isinstance(obj, SphereArray):
+        centers, radii = obj.centers, obj.radii
+    elif isinstance(obj, CylinderArray):
+        centers = (obj.base_points + obj.cap_points) / 2
+        half_lengths = numpy.linalg.norm(obj.cap_points - obj.base_points,
+                                         axis=1) / 2
+        radii = numpy.hypot(half_lengths, obj.radii)
+    else:
+        bounds = _local_sphere(obj)
+        if bounds is None:
+            return None
+        centers, radii = bounds[0].reshape((1, 3)), numpy.array([bounds[1]])
+    modifiers = obj.modifiers if hasattr(obj, 'modifiers') else obj.args
+    return _transform_spheres(centers, radii, modifiers)
+
+
+def _local_sphere(obj):
+    """ Bounding sphere of an object before its own transformations """
+    try:
+        if isinstance(obj, Sphere):
+            return _vector(obj.center), float(obj.radius)
+        if isinstance(obj, Box):
+            corner1, corner2 = _vector(obj.corner1), _vector(obj.corner2)
+            return (corner1 + corner2) / 2, numpy.linalg.norm(corner2 - corner1) / 2
+        if isinstance(obj, Cone):
+            return _segment_sphere(_vector(obj.base_point), _vector(obj.cap_point),
+                                   max(float(obj.base_radius), float(obj.cap_radius)))
+        if isinstance(obj, Cylinder):
+            return _segment_sphere(_vector(obj.base_point), _vector(obj.cap_point),
+                                   float(obj.radius))
+    except (TypeError, ValueError, IndexError):
+        # Identifiers or expressions instead of numbers
+        return None
+
+    if isinstance(obj, (Union, Merge, Intersection, Difference)):
+        children = [e for e in obj.args if isinstance(e, POVRayElement)
+                    and not isinstance(e, NON_GEOMETRIC)]
+        if isinstance(obj, Difference):
+            # Only the first object adds to the shape
+            children = children[:1]
+        spheres = [member_spheres(e) for e in children]
+        if not spheres or any(s is None for s in spheres):
+            return None
+        return _enclosing_sphere(numpy.concatenate([s[0] for s in spheres]),
+                                 numpy.concatenate([s[1] for s in spheres]))
+    return None
+
+
+def _segment_sphere(point1, point2, radius):
+    """ Bounding sphere of a cylinder of the given radius """
+    return ((point1 + point2) / 2,
+            numpy.hypot(numpy.linalg.norm(point2 - point1) / 2, radius))
+
+
+def _enclosing_sphere(centers, radii):
+    """ A sphere (not the smallest) enclosing all given spheres """
+    center = (numpy.min(centers - radii[:, None], axis=0) +
+              numpy.max(centers + radii[:, None], axis=0)) / 2
+    return center, float(numpy.max(numpy.linalg.norm(centers - center, axis=1) + radii))
+
+
+def _vector(value):
+    """ A 3-vector from a POV-Ray vector or number (promoted to <n,n,n>) """
+    vector = numpy.asarray(value, dtype=float)
+    return vector if vector.shape == (3,) else numpy.broadcast_to(vector, 3) * 1.0
+
+
+def _transform_spheres(centers, radii, modifiers):
+    """ Applies the transformations found in `modifiers`, in order, to the
+    spheres. Returns None if a transformation cannot be evaluated. """
+    modifiers = list(modifiers)
+    for i, e in enumerate(modifiers):
+        if not isinstance(e, str):
+            continue
+        if e in ('matrix', 'transform'):
+            return None
+        if e not in TRANSFORMS:
+            continue
+        try:
+            vector = _vector(modifiers[i + 1])
+        except (TypeError, ValueError, IndexError):
+            return None
+        if e == 'translate':
+            centers = centers + vector
+        elif e == 'scale':
+            centers = centers * vector
+            radii = radii * numpy.abs(vector).max()
+        else:
+            centers = centers @ rotation_matrix(vector).T
+    return centers, radii
+
+
+def rotation_matrix(angles):
+    """ Matrix of POV-Ray's `rotate <x, y, z>`: rotations (in degrees) about
+    the x, then the y, then the z axis """
+    (cx, cy, cz), (sx, sy, sz) = (numpy.cos(numpy.radians(angles)),
+                                  numpy.sin(numpy.radians(angles)))
+    x = numpy.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    y = numpy.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    z = numpy.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return z @ y @ x
+
+
+class Frustum:
+    """ The view volume of a perspective camera: a pyramid with its apex at
+    the camera location, opening along the viewing direction.
+
+    Use Frustum.from_camera to build it from a vapory Camera. """
+
+    def __init__(self, location, direction, right, up, tan_right, tan_up):
+        self.location = location
+        # Orthonormal viewing axes
+        self.direction = direction
+        self.right = right
+        self.up = up
+        # Tangents of half the horizontal and vertical field of view
+        self.tan_right = tan_right
+        self.tan_up = tan_up
+
+    @classmethod
+    def from_camera(cls, camera, aspect=None):
+        """ Returns the view volume of the Camera, or None if it cannot be
+        determined (other camera types, camera transformations, identifiers).
+
+        The vectors are combined as by POV-Ray: the angle sets the length of
+        the direction from the right vector, then look_at turns the camera,
+        keeping the lengths of the vectors. If `aspect` is given, the right
+        vector is <aspect, 0, 0>, as set by Scene.render. """
+        if not numpy_found:
+            raise IOError("Frustum requires numpy installed.")
+        vectors = dict(DEFAULT_CAMERA)
+        angle = look_at = None
+        args = list(camera.args)
+        try:
+            for i, e in enumerate(args):
+                if not isinstance(e, str):
+                    continue
+                if e in CAMERA_TYPES or e in TRANSFORMS + ('matrix', 'transform'):
+                    return None
+                if e in vectors:
+                    vectors[e] = args[i + 1]
+                elif e == 'look_at':
+                    look_at = _vector(args[i + 1])
+                elif e == 'angle':
+                    angle = float(args[i + 1])
+            if aspect is not None:
+                vectors['right'] = [aspect, 0, 0]
+            location, direction, right, up, sky = [
+                _vector(vectors[name])
+                for name in ('location', 'direction', 'right', 'up', 'sky')]
+        except (TypeError, ValueError, IndexError):
+            return None
+
+        lengths = [numpy.linalg.norm(v) for v in (direction, right, up)]
+        if angle is not None:
+            if not 0 < angle < 180:
+                return None
+            lengths[0] = 0.5 * lengths[1] / numpy.tan(numpy.radians(angle) / 2)
+        if look_at is not None:
+            direction = look_at - location
+            right = numpy.cross(sky, direction)
+            up = numpy.cross(direction, right)
+
+        axes = []
+        for v in (direction, right, up):
+            norm = numpy.linalg.norm(v)
+            if not norm:
+                return None
+            axes.append(v / norm)
+        if max(abs(axes[0] @ axes[1]), abs(axes[0] @ axes[2]),
+               abs(axes[1] @ axes[2])) > 1e-6:
+            # Skewed cameras are left alone
+            return None
+        return cls(location, *axes, 0.5 * lengths[1] / lengths[0],
+                   0.5 * lengths[2] / lengths[0])
+
+    def visible(self, centers, radii, margin=0):
+        """ Returns a boolean array telling, for each sphere, whether it lies
+        at least partly within the view volume (grown by `margin`). """
+        offsets = numpy.asarray(centers, dtype=float) - self.location
+        radii = numpy.asarray(radii, dtype=float) + margin
+        depth = offsets @ self.direction
+        outside = depth < -radii
+        for axis, tangent in ((self.right, self.tan_right), (self.up, self.tan_up)):
+            # Distance to the nearest of the two side planes along this axis
+            distance = ((numpy.abs(offsets @ axis) - tangent * depth) /
+                        numpy.hypot(1, tangent))
+            outside |= distance > radii
+        return ~outside
+
+    def screen_box(self, centers, radii):
+        """ Returns the rectangle (left, right, top, bottom) of the image
+        covering the spheres, in fractions of the image width and height
+        from its top left corner, clipped to the image. Returns None if a
+        sphere reaches behind the camera, where the projection is unbounded.
+
+        The projection of a sphere on each image axis is computed exactly,
+        from the disk it projects to in the plane of that axis and the
+        viewing direction. """
+        offsets = numpy.asarray(centers, dtype=float).reshape((-1, 3)) - self.location
+        radii = numpy.asarray(radii, dtype=float).reshape(-1)
+        depth = offsets @ self.direction
+        if not len(radii) or (depth <= radii).any():
+            return None
+        bounds = []
+        for axis, tangent in ((self.right, self.tan_right), (self.up, self.tan_up)):
+            lateral = offsets @ axis
+            # Slopes of the two tangents from the camera to the disk
+            spread = radii * numpy.sqrt(lateral ** 2 + depth ** 2 - radii ** 2)
+            scale = depth ** 2 - radii ** 2
+            low = ((lateral * depth - spread) / scale).min() / tangent
+            high = ((lateral * depth + spread) / scale).max() / tangent
+            bounds.append(numpy.clip([(low + 1) / 2, (high + 1) / 2], 0, 1))
+        (left, right), (bottom, top) = bounds
+        return float(left), float(right), float(1 - top), float(1 - bottom)
+
+
+def cull_objects(objects, camera, aspect=None, margin=0, instances=None):
+    """ Returns the list of objects without those lying entirely out of the
+    view of the camera. SphereArray and CylinderArray batches are culled per
+    member. Objects of unknown size are kept, and so are all objects if the
+    view volume of the camera cannot be determined.
+
+    The test is done at once for all objects and members.
+    """
+    frustum = Frustum.from_camera(camera, aspect)
+    if frustum is None:
+        return list(objects)
+
+    spheres = [member_spheres(e, instances) if isinstance(e, POVRayElement) else None
+               for e in objects]
+    sizes = [0 if s is None else len(s[1]) for s in spheres]
+    bounded = [s for s in spheres if s is not None]
+    if not bounded:
+        return list(objects)
+    visible = frustum.visible(numpy.concatenate([s[0] for s in bounded]),
+                              numpy.concatenate([s[1] for s in bounded]),
+                              margin)
+
+    culled = []
+    start = 0
+    for e, size, s in zip(objects, sizes, spheres):
+        if s is None:
+            culled.append(e)
+            continue
+        mask = visible[start:start + size]
+        start += size
+        if mask.all():
+            culled.append(e)
+        elif mask.any():
+            # Batches read from a data file are kept whole
+            if isinstance(e, (SphereArray, CylinderArray)) and e.data_file is None:
+                e = e._subset(mask)
+            culled.append(e)
+    return culled
+
+
+def bounding_hierarchy(objects, leaf_size=16, instances=None):
+    """ Returns the objects grouped into a tree of nested unions, each with a
+    tight `bounded_by` box, so that POV-Ray only tests the rays against the
+    objects in the boxes they hit, rather than against every object of a
+    large flat union.
+
+    The tree is a bounding volume hierarchy built top-down: the objects are
+    split in two halves along the longest axis of their centers, until at
+    most `leaf_size` objects remain. SphereArray and CylinderArray batches
+    are split per member. Objects of unknown size are kept out of the tree
+    and come first in the returned list, in their original order. See
+    bounding_sphere for the `instances`.
+    """
+    if not numpy_found:
+        raise IOError("Function bounding_hierarchy requires numpy installed.")
+    unbounded, owners, members, centers, radii = [], [], [], [], []
+    for i, e in enumerate(objects):
+        spheres = None
+        if isinstance(e, (SphereArray, CylinderArray)) and e.data_file is None:
+            spheres = member_spheres(e)
+            index = numpy.arange(len(e.texture_ids))
+        elif isinstance(e, POVRayElement):
+            sphere = bounding_sphere(e, instances)
+            if sphere is not None:
+                spheres = sphere[0].reshape((1, 3)), numpy.array([sphere[1]])
+                index = numpy.array([-1])
+        if spheres is None:
+            unbounded.append(e)
+            continue
+        owners.append(numpy.full(len(index), i))
+        members.append(index)
+        centers.append(spheres[0])
+        radii.append(spheres[1])
+
+    if not owners or sum(map(len, owners)) <= leaf_size:
+        return list(objects)
+    centers = numpy.concatenate(centers)
+    radii = numpy.concatenate(radii)[:, None]
+    tree = _BoundingTree(objects, numpy.concatenate(owners),
+                         numpy.concatenate(members), centers,
+                         centers - radii, centers + radii, leaf_size)
+    return unbounded + [tree.node(numpy.arange(len(centers)))]
+
+
+class _BoundingTree:
+    """ The data shared by the nodes of bounding_hierarchy: for each item
+    (object or batch member), its owner in `objects`, its index in the
+    batch (-1 for a whole object), its center and its box corners. """
+
+    def __init__(self, objects, owners, members, centers, lows, highs,
+                 leaf_size):
+        self.objects = objects
+        self.owners = owners
+        self.members = members
+        self.centers = centers
+        self.lows = lows
+        self.highs = highs
+        self.leaf_size = leaf_size
+
+    def node(self, items):
+        """ The bounded union of the given items """
+        if len(items) <= self.leaf_size:
+            children = self.leaf(items)
+        else:
+            centers = self.centers[items]
+            axis = numpy.argmax(centers.max(axis=0) - centers.min(axis=0))
+            items = items[numpy.argsort(centers[:, axis], kind='stable')]
+            half = len(items) // 2
+            children = [self.node(items[:half]), self.node(items[half:])]
+        box = Box(self.lows[items].min(axis=0).tolist(),
+                  self.highs[items].max(axis=0).tolist())
+        return Union(*children, BoundedBy(box))
+
+    def leaf(self, items):
+        """ The objects of the items, batches being reduced to the members
+        among the items """
+        items = numpy.sort(items)
+        owners = self.owners[items]
+        children = []
+        for owner in numpy.unique(owners):
+            e = self.objects[owner]
+            members = self.members[items[owners == owner]]
+            children.append(e if members[0] < 0 else e._subset(members))
+        return children
@@ -1,3 +1,11 @@
+from .config import FLOAT_PRECISION
+
+try:
+    import numpy
+    numpy_found=True
+except ImportError:
+    numpy_found=False
+
 WIKIREF = "http://wiki.povray.org/content/Reference:"
 
 def vectorize(arr):
@@ -15,3 +23,53 @@ def format_if_necessary(e):
         return vectorize(e)
     else:
         return e
+
+def number_format(arr, precision=FLOAT_PRECISION):
+    """ Returns the %-format used to write the numbers of `arr`: integers as
+    such, floats with `precision` significant digits (all of them if None) """
+    if numpy.issubdtype(arr.dtype, numpy.integer):
+        return "%d"
+    return "%%.%dg" % (17 if precision is None else precision)
+
+def format_rows(arr, template, precision=FLOAT_PRECISION, sep="\n"):
+    """ Formats every row of the 2D array `arr` with `template`, in which each
+    '{}' stands for one column, and joins the rows with `sep`.
+
+    The whole array is formatted by a single %-operation, which is much
+    faster than formatting the numbers one by one.
+
+    >>> format_rows([[1, 2], [3, 4]], "sphere{<{},0,0>,{}}")
+    'sphere{<1,0,0>,2}\\nsphere{<3,0,0>,4}'
+    """
+    if not numpy_found:
+        raise IOError("Function format_rows requires numpy installed.")
+    arr = numpy.asarray(arr)
+    if arr.ndim == 1:
+        arr = arr.reshape((-1, 1))
+    if len(arr) == 0:
+        return ""
+    row = template.replace("%", "%%").replace("{}", number_format(arr, precision))
+    text = (row + sep) * len(arr) % tuple(arr.ravel().tolist())
+    return text[:-len(sep)] if sep else text
+
+def vectorize_array(arr, precision=FLOAT_PRECISION, sep="\n"):
+    """ transforms [[a, b, c], [d, e, f]] into string "<a,b,c>\\n<d,e,f>" """
+    if not numpy_found:
+        raise IOError("Function vectorize_array requires numpy installed.")
+    arr = numpy.asarray(arr)
+    return format_rows(arr, "<%s>" % ",".join(["{}"] * arr.shape[1]),
+                       precision, sep)
+
+def format_array(arr, precision=FLOAT_PRECISION):
+    """ transforms [a, -b] into the list of strings ["a", "( -b )"], like
+    format_if_necessary does for single numbers """
+    if not numpy_found:
+        raise IOError("Function format_array requires numpy installed.")
+    arr = numpy.asarray(arr).ravel()
+    if len(arr) == 0:
+        return []
+    formatted = format_rows(arr, "{}", precision).split("\n")
+    for i in numpy.flatnonzero(arr < 0):
+        # This format because POVray interprets -3 as a substraction
+        formatted[i] = "( %s )" % formatted[i]
+    return formatted
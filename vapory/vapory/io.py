@@ -4,7 +4,11 @@ All the advanced Input/Output operations for Vapory
 
 import re
 import os
+import io
+import asyncio
 import subprocess
+import threading
+from tempfile import mkstemp
 from .config import POVRAY_BINARY
 
 try:
@@ -13,6 +17,18 @@ try:
 except IOError:
     numpy_found=False
 
+# Older imageio versions (as pinned through moviepy) have no v3 API, but the
+# same imread function
+try:
+    import imageio.v3 as imageio
+    imageio_found=True
+except ImportError:
+    try:
+        import imageio
+        imageio_found=True
+    except ImportError:
+        imageio_found=False
+
 try:
     from IPython.display import Image
     ipython_found=True
@@ -24,6 +40,10 @@ def ppm_to_numpy(filename=None, buffer=None, byteorder='>'):
 
     Format specification: http://netpbm.sourceforge.net/doc/pgm.html
 
+    The array is a read-only view of the buffer (no copy is made), of shape
+    (height, width) for PGM and (height, width, 3) for PPM, with dtype
+    uint8, or uint16 for images of more than 8 bits per color.
+
     """
 
     if not numpy_found:
@@ -32,30 +52,60 @@ def ppm_to_numpy(filename=None, buffer=None, byteorder='>'):
     if buffer is None:
         with open(filename, 'rb') as f:
             buffer = f.read()
-    try:
-        header, width, height, maxval = re.search(
-            b"(^P\d\s(?:\s*#.*[\r\n])*"
-            b"(\d+)\s(?:\s*#.*[\r\n])*"
-            b"(\d+)\s(?:\s*#.*[\r\n])*"
-            b"(\d+)\s(?:\s*#.*[\r\n]\s)*)", buffer).groups()
-    except AttributeError:
-        raise ValueError("Not a raw PPM/PGM file: '%s'" % filename)
 
-    cols_per_pixels = 1 if header.startswith(b"P5") else 3
+    header = memoryview(buffer)[:512].tobytes()
+    if header[:2] not in (b"P5", b"P6"):
+        raise ValueError("Not a raw PPM/PGM file: '%s'" % filename)
 
-    dtype = 'uint8' if int(maxval) < 256 else byteorder+'uint16'
+    # Three numbers (width, height, maxval) separated by whitespace or
+    # comments, then a single whitespace character before the pixels
+    fields, position = [], 2
+    while len(fields) < 3:
+        while position < len(header) and header[position] in b" \t\r\n":
+            position += 1
+        if header[position:position + 1] == b"#":
+            position = header.find(b"\n", position) + 1 or len(header)
+            continue
+        start = position
+        while position < len(header) and header[position] in b"0123456789":
+            position += 1
+        if start == position:
+            raise ValueError("Not a raw PPM/PGM file: '%s'" % filename)
+        fields.append(int(header[start:position]))
+    width, height, maxval = fields
+    offset = position + 1
+
+    channels = 1 if header.startswith(b"P5") else 3
+    dtype = 'uint8' if maxval < 256 else byteorder+'u2'
     arr = numpy.frombuffer(buffer, dtype=dtype,
-                           count=int(width)*int(height)*3,
-                           offset=len(header))
+                           count=width*height*channels,
+                           offset=offset)
+
+    shape = (height, width) if channels == 1 else (height, width, 3)
+    return arr.reshape(shape)
+
+
+def png_to_numpy(filename=None, buffer=None):
+    """Return image data from a PNG file (or its bytes) as numpy array, of
+    shape (height, width, 3), or (height, width, 4) if the image has an
+    alpha channel, with dtype uint8, or uint16 for 16 bits per color if the
+    imageio plugin decoding the file supports it (Pillow does not).
+
+    Requires imageio.
+
+    """
 
-    return arr.reshape((int(height), int(width), 3))
+    if not imageio_found:
+        raise IOError("Function png_to_numpy requires imageio installed.")
 
+    return imageio.imread(filename if buffer is None else buffer)
 
 
 def render_povstring(string, outfile=None, height=None, width=None,
                      quality=None, antialiasing=None, remove_temp=True,
                      show_window=False, tempfile=None, includedirs=None,
-                     output_alpha=False):
+                     output_alpha=False, stdin=False, bits_per_color=None,
+                     options=None, return_stats=False):
 
     """ Renders the provided scene description with POV-Ray.
 
@@ -63,12 +113,14 @@ def render_povstring(string, outfile=None, height=None, width=None,
     ------------
 
     string
-      A string representing valid POVRay code. Typically, it will be the result
-      of scene(*objects)
+      A string representing valid POVRay code, or an object with a
+      ``write(fileobj)`` method such as a Scene, which is then streamed to
+      the POV-Ray input file without building the whole text in memory.
 
     outfile
       Name of the PNG file for the output.
       If outfile is None, a numpy array is returned (if numpy is installed).
+      If outfile is 'bytes', the PNG image is returned as bytes.
       If outfile is 'ipython' and this function is called last in an IPython
       notebook cell, this will print the result in the notebook.
 
@@ -78,36 +130,154 @@ def render_povstring(string, outfile=None, height=None, width=None,
     width
       width in pixels
 
+    tempfile
+      Name of the POV-Ray input file to write. By default a new file with a
+      unique name is made in the current directory, so that concurrent
+      renders do not overwrite each other's input.
+
     output_alpha
       If true, the background will be transparent,
-    rather than the default black background.  Note
-    that this option is ignored if rendering to a
-    numpy array, due to limitations of the intermediate
-    ppm format.
+    rather than the default black background. When
+    rendering to a numpy array, the image is then passed
+    as PNG rather than PPM, and the array gets a fourth
+    (alpha) channel; this requires imageio.
+
+    bits_per_color
+      Bits per color channel of the output, e.g. 16 for
+      PNG images and numpy arrays of dtype uint16.
+
+    stdin
+      If true, the scene is streamed to POV-Ray on its standard input
+      (+I-) and no file is written at all.
+
+    options
+      List of other POV-Ray command line options, e.g. ['+SR10', '+ER20']
+      to render rows 10 to 20 only.
+
+    return_stats
+      If true, returns a tuple (result, stats) where stats is the dict of
+      render statistics POV-Ray printed (see parse_povray_stats).
 
     """
 
-    pov_file = tempfile or '__temp__.pov'
-    with open(pov_file, 'w+') as f:
-        f.write(string)
+    pov_file = '-' if stdin else _write_pov_file(string, tempfile)
 
-    return_np_array = (outfile is None)
-    display_in_ipython = (outfile=='ipython')
+    cmd, output = _povray_command(pov_file, outfile, height, width, quality,
+                                  antialiasing, show_window, includedirs,
+                                  output_alpha, bits_per_color, options)
+    process = subprocess.Popen(cmd, stderr=subprocess.PIPE,
+                                    stdout=subprocess.PIPE,
+                                    stdin=subprocess.PIPE if stdin else None)
+
+    if stdin:
+        # The scene is written by a thread while communicate() reads the
+        # output, as POV-Ray may fill its output pipes before the end of
+        # the input. The pipe is detached so that communicate() leaves it.
+        writer = threading.Thread(target=_write_pov_stream,
+                                  args=(string, process.stdin))
+        process.stdin = None
+        writer.start()
+        out, err = process.communicate()
+        writer.join()
+    else:
+        out, err = process.communicate()
+
+    if remove_temp and not stdin:
+        os.remove(pov_file)
 
-    format_type = "P" if return_np_array else "N"
+    return _render_output(output, process.returncode, out, err, return_stats)
 
-    if return_np_array:
-        outfile='-'
 
-    if display_in_ipython:
-        outfile = '__temp_ipython__.png'
+def render_povfile(filename, outfile=None, height=None, width=None,
+                   quality=None, antialiasing=None, show_window=False,
+                   includedirs=None, output_alpha=False, bits_per_color=None,
+                   options=None, return_stats=False):
+    """ Renders an existing POV-Ray file, which is left in place; e.g. to
+    render several parts of one scene (see the `options` of
+    render_povstring) without writing it again. Takes the other parameters
+    and returns the same results as render_povstring. """
 
-    cmd = [POVRAY_BINARY, pov_file]
+    cmd, output = _povray_command(filename, outfile, height, width, quality,
+                                  antialiasing, show_window, includedirs,
+                                  output_alpha, bits_per_color, options)
+    process = subprocess.Popen(cmd, stderr=subprocess.PIPE,
+                                    stdout=subprocess.PIPE)
+    out, err = process.communicate()
+    return _render_output(output, process.returncode, out, err, return_stats)
+
+
+async def render_povstring_async(string, outfile=None, height=None,
+                                 width=None, quality=None, antialiasing=None,
+                                 show_window=False, includedirs=None,
+                                 output_alpha=False, bits_per_color=None,
+                                 options=None, return_stats=False):
+    """ Coroutine rendering the provided scene description with POV-Ray,
+    for use with asyncio. Takes the same parameters and returns the same
+    results as render_povstring.
+
+    The scene is streamed to POV-Ray on its standard input, piece by piece
+    for scenes with an ``iter_chunks()`` method, while the event loop is
+    free to do other work. Cancelling the coroutine kills POV-Ray.
+    """
+
+    cmd, output = _povray_command('-', outfile, height, width, quality,
+                                  antialiasing, show_window, includedirs,
+                                  output_alpha, bits_per_color, options)
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+
+    async def write_scene():
+        chunks = [string] if isinstance(string, str) else string.iter_chunks()
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk.encode('ascii', 'replace'))
+                await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # POV-Ray stopped reading, it reports why on stderr
+            pass
+
+    try:
+        _, out, err = await asyncio.gather(write_scene(), process.stdout.read(),
+                                           process.stderr.read())
+        await process.wait()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    return _render_output(output, process.returncode, out, err, return_stats)
+
+
+def _povray_command(pov_file, outfile, height, width, quality, antialiasing,
+                    show_window, includedirs, output_alpha, bits_per_color,
+                    options=None):
+    """ Returns the POV-Ray command line for the given render_povstring
+    parameters, and the kind of output to make of what POV-Ray writes:
+    'array', 'png_array', 'bytes', 'ipython' or 'file'. """
+
+    if outfile is None:
+        # The PPM format has no alpha channel: arrays with alpha go through PNG
+        output = 'png_array' if output_alpha else 'array'
+    elif outfile in ('bytes', 'ipython'):
+        output = outfile
+    else:
+        output = 'file'
+
+    format_type = "P" if output == 'array' else "N"
+
+    if output != 'file':
+        outfile='-'
+
+    cmd = [POVRAY_BINARY, '+I%s' % pov_file]
     if height is not None: cmd.append('+H%d'%height)
     if width is not None: cmd.append('+W%d'%width)
     if quality is not None: cmd.append('+Q%d'%quality)
     if antialiasing is not None: cmd.append('+A%f'%antialiasing)
     if output_alpha: cmd.append('Output_Alpha=on')
+    if bits_per_color is not None: cmd.append('Bits_Per_Color=%d'%bits_per_color)
     if not show_window:
         cmd.append('-D')
     else:
@@ -115,25 +285,143 @@ def render_povstring(string, outfile=None, height=None, width=None,
     if includedirs is not None:
         for dir in includedirs:
             cmd.append('+L%s'%dir)
+    if options is not None:
+        cmd.extend(options)
     cmd.append("Output_File_Type=%s"%format_type)
     cmd.append("+O%s"%outfile)
-    process = subprocess.Popen(cmd, stderr=subprocess.PIPE,
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE)
+    return cmd, output
 
-    out, err = process.communicate(string.encode('ascii'))
 
-    if remove_temp:
-        os.remove(pov_file)
+def parse_povray_stats(err):
+    """ Returns the statistics POV-Ray prints on its standard error after a
+    render (`err`, as bytes or str) as a dict:
+
+    - 'times': seconds per phase, e.g. {'parse': 1.2, 'photon': 0.5,
+      'radiosity_final': 0.2, 'trace': 2.5}
+    - 'cpu_times': CPU-seconds per phase, summed over the threads
+    - 'counts': the render counters, e.g. 'pixels', 'samples', 'rays',
+      'shadow_ray_tests', 'shadow_cache_hits'
+    - 'intersections': {shape: (tests, succeeded)} from the Ray->Shape
+      intersection table
+
+    Statistics that POV-Ray did not print are missing from the dict.
+    """
 
-    if process.returncode:
+    if isinstance(err, bytes):
+        err = err.decode('ascii', 'replace')
+
+    stats = dict(times={}, cpu_times={}, counts={}, intersections={})
+    for match in TIME_PATTERN.finditer(err):
+        phase = _stat_key(match.group(1))
+        stats['times'][phase] = float(match.group(2))
+        if match.group(3) is not None:
+            stats['cpu_times'][phase] = float(match.group(3))
+
+    in_statistics = in_intersections = False
+    for line in err.splitlines():
+        if line.startswith('Render Statistics'):
+            in_statistics = True
+        elif line.strip().startswith('Render Time'):
+            # The (indented) phase times follow, read with TIME_PATTERN
+            in_statistics = in_intersections = False
+        elif line.startswith('Ray->Shape Intersection'):
+            in_intersections = True
+        elif line.startswith('---'):
+            # The intersection table ends at the second rule after its header
+            if in_intersections and stats['intersections']:
+                in_intersections = False
+        elif in_intersections:
+            match = INTERSECTION_PATTERN.match(line)
+            if match:
+                stats['intersections'][match.group(1)] = (int(match.group(2)),
+                                                          int(match.group(3)))
+        elif in_statistics:
+            fields = COUNT_PATTERN.findall(line)
+            for name, value in fields:
+                key = _stat_key(name)
+                if key == 'succeeded':
+                    # e.g. "Shadow Ray Tests: 54321  Succeeded: 1234"
+                    key = _stat_key(fields[0][0]) + '_succeeded'
+                stats['counts'][key] = _stat_value(value)
+    return stats
+
+
+TIME_PATTERN = re.compile(r'^[ \t]*(\w[\w ()]*?) Time:[^(\n]*\(([\d.]+) seconds\)'
+                          r'(?:\s*using \d+ thread\(s\) with ([\d.]+) CPU-seconds)?',
+                          re.MULTILINE)
+INTERSECTION_PATTERN = re.compile(r'^(\S.*?)\s+(\d+)\s+(\d+)\s+[\d.]+\s*$')
+COUNT_PATTERN = re.compile(r'([A-Za-z][A-Za-z/ ]*?):\s+([\d./]+)')
+
+
+def _stat_key(name):
+    """ 'Radiosity (final)' -> 'radiosity_final' """
+    return '_'.join(re.findall(r'[a-z0-9]+', name.lower()))
+
+
+def _stat_value(value):
+    """ The number in a statistics field, or the text if it is not one
+    (e.g. '2/5' for the maximum trace level) """
+    for number in (int, float):
+        try:
+            return number(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _render_output(output, returncode, out, err, return_stats=False):
+    """ Checks the result of POV-Ray and converts its standard output to
+    the requested kind of output (see _povray_command), with the render
+    statistics if return_stats is set """
+
+    if returncode:
         print(type(err), err)
         raise IOError("POVRay rendering failed with the following error: "+err.decode('ascii'))
 
-    if return_np_array:
-        return ppm_to_numpy(buffer=out)
-
-    if display_in_ipython:
+    if output == 'png_array':
+        result = png_to_numpy(buffer=out)
+    elif output == 'array':
+        result = ppm_to_numpy(buffer=out)
+    elif output == 'bytes':
+        result = out
+    elif output == 'ipython':
         if not ipython_found:
             raise("The 'ipython' option only works in the IPython Notebook.")
-        return Image(outfile)
+        result = Image(data=out, format='png')
+    else:
+        result = None
+
+    if return_stats:
+        return result, parse_povray_stats(err)
+    return result
+
+
+def _write_pov_file(string, tempfile=None):
+    """ Writes the scene (a string, or an object with a write method) to
+    `tempfile`, or to a new uniquely named file in the current directory,
+    and returns the name of the file. """
+    if tempfile is None:
+        fd, tempfile = mkstemp(suffix='.pov', prefix='__temp__', dir='.')
+        f = os.fdopen(fd, 'w')
+    else:
+        f = open(tempfile, 'w+')
+    with f:
+        if isinstance(string, str):
+            f.write(string)
+        else:
+            string.write(f)
+    return tempfile
+
+
+def _write_pov_stream(string, pipe):
+    """ Writes the scene to the binary `pipe` and closes it. A render
+    failing early closes the pipe, which is not an error here as POV-Ray
+    reports it. """
+    try:
+        with io.TextIOWrapper(pipe, encoding='ascii', errors='replace') as f:
+            if isinstance(string, str):
+                f.write(string)
+            else:
+                string.write(f)
+    except (BrokenPipeError, ValueError):
+        pass
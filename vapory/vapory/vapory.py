@@ -1,9 +1,20 @@
 import webbrowser # <= to open the POVRay help
-from copy import deepcopy
+import hashlib
+import os
+import time
+from copy import copy as shallow_copy
 import re
-from .io import render_povstring
+from .io import render_povstring, render_povstring_async
 
-from .helpers import WIKIREF, vectorize, format_if_necessary
+from .helpers import (WIKIREF, vectorize, format_if_necessary, format_rows,
+                      vectorize_array)
+from .config import CHUNK_SIZE, FLOAT_PRECISION
+
+try:
+    import numpy
+    numpy_found=True
+except ImportError:
+    numpy_found=False
 
 class Scene:
     """ A scene contains Items and can be written to a file.
@@ -15,10 +26,15 @@ class Scene:
                        items=[light_source, myshpere, my_box],
                        included)
 
+    Objects that stay the same over many frames of an animation can be
+    given as `static` objects. They are written like the other objects, but
+    can also be written once to a shared file with write_static, and be
+    replaced by an #include of that file with include_static.
+
     """
     def __init__(self, camera, objects=[], atmospheric=[],
                  included=[], defaults=[], global_settings=[],
-                 declares=[]):
+                 declares=[], static=[]):
 
         self.camera = camera
         self.objects = objects
@@ -27,22 +43,80 @@ class Scene:
         self.defaults = defaults
         self.declares = declares
         self.global_settings = global_settings
+        self.static = static
+        # Objects declared by instance_objects, by name
+        self.instances = {}
 
     def __str__(self):
+        return "".join(self.iter_chunks())
+
+    def _iter_tokens(self):
+        """ Yields the text pieces and top-level elements of the scene in file
+        order. Elements are yielded as-is, to be expanded by the serializer. """
 
         included = ['#include "%s"'%e for e in self.included]
         defaults = ['#default { %s }'%e for e in self.defaults]
         declares = ['#declare %s;'%e for e in self.declares]
 
-        global_settings = ["global_settings{\n%s\n}"%("\n".join(
-                           [str(e) for e in self.global_settings]))]
-        return '\n'.join([str(e)
-                          for l in  [included, declares, self.objects, [self.camera],
-                              self.atmospheric, global_settings]
-                          for e in l])
+        entries = [e for l in [included, declares, self.static, self.objects,
+                               [self.camera], self.atmospheric]
+                   for e in l]
+        yield from _lines(entries)
+        yield "global_settings{\n"
+        for e in _joined(self.global_settings, "\n"):
+            yield e
+        yield "\n}"
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """ Yields the POV-Ray source of the scene as successive strings of
+        about `chunk_size` characters, without ever building the whole text.
+        Deep CSG trees are walked without recursion. """
+        return _serialize(self._iter_tokens(), chunk_size)
+
+    def write(self, fileobj, chunk_size=CHUNK_SIZE):
+        """ Streams the POV-Ray source of the scene to a (text) file object,
+        such as an open file or a pipe. Returns the number of characters
+        written. """
+        written = 0
+        for chunk in self.iter_chunks(chunk_size):
+            fileobj.write(chunk)
+            written += len(chunk)
+        return written
+
+    def iter_static_chunks(self, chunk_size=CHUNK_SIZE):
+        """ Yields the POV-Ray source of the static objects only, in strings
+        of about `chunk_size` characters. """
+        return _serialize(_lines(self.static), chunk_size)
+
+    def write_static(self, fileobj, chunk_size=CHUNK_SIZE):
+        """ Streams the POV-Ray source of the static objects only to a (text)
+        file object, typically a .inc file shared by several frames. Returns
+        the number of characters written. """
+        written = 0
+        for chunk in self.iter_static_chunks(chunk_size):
+            fileobj.write(chunk)
+            written += len(chunk)
+        return written
+
+    def include_static(self, filename):
+        """ Returns a copy of the scene in which the static objects are
+        replaced by an #include of `filename`, to which they should have been
+        written with write_static. """
+        new = self.copy()
+        new.static = ['#include "%s"' % filename]
+        return new
 
     def copy(self):
-        return deepcopy(self)
+        """ Returns a copy of the scene with its own lists of objects,
+        declares, etc. The elements themselves are shared with this scene
+        rather than copied: scenes and elements are treated as values, and
+        every modifying method returns a new one instead. """
+        new = shallow_copy(self)
+        for field in ['objects', 'atmospheric', 'included', 'defaults',
+                      'declares', 'global_settings', 'static']:
+            setattr(new, field, list(getattr(self, field)))
+        new.instances = dict(self.instances)
+        return new
 
     def set_camera(self, new_camera):
         new = self.copy()
@@ -52,13 +126,228 @@ class Scene:
     def add_objects(self, objs):
 
         new = self.copy()
-        new.objects +=  objs
+        new.objects +=  list(objs)
+        return new
+
+    def hoist_declares(self, min_count=2, prefix="VP_", types=None):
+        """ Returns a copy of the scene in which every modifier (texture,
+        pigment, finish...) occurring at least `min_count` times is written
+        once as a #declare, and referenced by name from the objects.
+
+        Modifiers are compared by their POV-Ray source, so identical textures
+        built separately for each object are shared too. The scene itself is
+        left untouched.
+
+        Parameters
+        ------------
+
+        min_count
+          Number of occurrences from which a modifier gets declared.
+
+        prefix
+          Prefix of the declared identifiers, which are named like
+          VP_texture_0, VP_finish_1...
+
+        types
+          Tuple of element classes to consider, HOISTABLE_MODIFIERS by
+          default.
+        """
+        types = HOISTABLE_MODIFIERS if types is None else types
+        texts = {}
+
+        def text(e):
+            # Keyed on id() since shared instances are very common; the
+            # element is kept in the dict so that its id stays unique
+            if id(e) not in texts:
+                texts[id(e)] = (e, str(e))
+            return texts[id(e)][1]
+
+        sections = [self.objects, self.atmospheric]
+        counts = {}
+        for e in _iter_elements(sections):
+            if isinstance(e, types) and not e._is_reference():
+                counts[text(e)] = counts.get(text(e), 0) + 1
+
+        names = {}
+        declares = list(self.declares)
+
+        def reference(e):
+            if not isinstance(e, types) or e._is_reference():
+                return None
+            key = text(e)
+            if counts[key] < min_count:
+                return None
+            if key not in names:
+                names[key] = "%s%s_%d" % (prefix, e.transformed_name().lower(),
+                                          len(names))
+                declares.append("%s = %s" % (names[key], key))
+            return type(e)(names[key])
+
+        new = shallow_copy(self)
+        new.objects, new.atmospheric = _substitute(sections, reference)
+        new.declares = declares
+        return new
+
+    def instance_objects(self, min_count=2, prefix="VP_"):
+        """ Returns a copy of the scene in which top-level objects (regular
+        and static) that only differ by their position or by their trailing
+        transformations are written once as a #declare, and placed with
+        `object { Name translate ... }`.
+
+        Trailing translate/rotate/scale pairs are always split off. Spheres,
+        boxes, cones and cylinders are also moved to the origin (their first
+        point becoming a translation) when their textures do not depend on
+        the position, e.g. plain colors and finishes. The scene itself is
+        left untouched.
+
+        Parameters
+        ------------
+
+        min_count
+          Number of occurrences from which an object gets declared.
+
+        prefix
+          Prefix of the declared identifiers, named like VP_object_3f2a9c01e4b7
+          after a hash of the object, so that an object gets the same name
+          in every frame (and the static objects the same text).
+        """
+        sections = [self.objects, self.static]
+        splits = {}
+        counts = {}
+        for e in [e for section in sections for e in section]:
+            if isinstance(e, INSTANCEABLE_OBJECTS) and id(e) not in splits:
+                core, transforms = _split_transforms(e)
+                splits[id(e)] = (str(core), transforms, core)
+                counts[splits[id(e)][0]] = counts.get(splits[id(e)][0], 0) + 1
+
+        names = {}
+        new = self.copy()
+
+        def instance(e):
+            if id(e) not in splits or counts[splits[id(e)][0]] < min_count:
+                return e
+            key, transforms, core = splits[id(e)]
+            if key not in names:
+                names[key] = "%sobject_%s" % (
+                    prefix, hashlib.sha1(key.encode()).hexdigest()[:12])
+                new.declares.append("%s = %s" % (names[key], key))
+                new.instances[names[key]] = core
+            return Object(names[key], *transforms)
+
+        new.objects, new.static = [[instance(e) for e in section]
+                                   for section in sections]
+        return new
+
+    def profile(self):
+        """ Returns statistics on the complexity of the scene, as a dict which
+        can be dumped to JSON, to spot the frames which will be slow to
+        serialize or to parse by POV-Ray before rendering them.
+
+        The dict holds:
+
+        counts
+          Number of elements of each type (e.g. {"Sphere": 120, ...}).
+
+        array_members
+          Number of primitives held in SphereArray/CylinderArray batches.
+
+        csg_depth
+          Deepest nesting of CSG objects (unions, differences...).
+
+        distinct_textures
+          Number of textures with a different POV-Ray source.
+
+        object_bytes
+          Size of the source of each static and regular top-level object,
+          as a list of {"type": ..., "bytes": ...}.
+
+        serialization
+          Size in bytes of the whole scene and the time in seconds it took
+          to serialize it.
+        """
+        start = time.perf_counter()
+        size = sum(len(chunk.encode()) for chunk in self.iter_chunks())
+        seconds = time.perf_counter() - start
+
+        sections = [self.static, self.objects, [self.camera], self.atmospheric,
+                    self.global_settings]
+        counts = {}
+        textures = set()
+        members = 0
+        for element in _iter_elements(sections):
+            elements = [element]
+            if isinstance(element, _PrimitiveArray):
+                members += len(element.texture_ids)
+                # The textures of the batches are not among their arguments
+                elements += _iter_elements(element.textures)
+            for e in elements:
+                name = type(e).__name__
+                counts[name] = counts.get(name, 0) + 1
+                if isinstance(e, Texture):
+                    textures.add(str(e))
+
+        object_bytes = [{"type": type(e).__name__,
+                         "bytes": sum(len(chunk.encode())
+                                      for chunk in _serialize(_lines([e])))}
+                        for e in self.static + self.objects]
+
+        return {"counts": counts,
+                "array_members": members,
+                "csg_depth": _csg_depth(sections),
+                "distinct_textures": len(textures),
+                "object_bytes": object_bytes,
+                "serialization": {"bytes": size, "seconds": seconds}}
+
+    def cull(self, aspect=None, margin=0, static=False):
+        """ Returns a copy of the scene without the objects lying entirely out
+        of the view of the camera, and with the out-of-view members removed
+        from SphereArray and CylinderArray batches. See geometry.cull_objects.
+
+        The static objects are only culled if `static` is set, as they then
+        no longer stay the same between frames (do not cull them when they
+        are written to a shared file, see write_static). Objects out of view
+        may still cast shadows or show in reflections; use a `margin` (in
+        scene units) to keep the objects close to the edges of the view.
+
+        Parameters
+        ------------
+
+        aspect
+          Width/height ratio of the image, if the scene is to be rendered
+          with auto_camera_angle (the default of render).
+
+        margin
+          Distance by which the objects may lie out of view and still be
+          kept.
+
+        static
+          Whether to cull the static objects too.
+        """
+        from .geometry import cull_objects
+        new = self.copy()
+        new.objects = cull_objects(self.objects, self.camera, aspect, margin,
+                                   self.instances)
+        if static:
+            new.static = cull_objects(self.static, self.camera, aspect, margin,
+                                      self.instances)
+        return new
+
+    def bound(self, leaf_size=16):
+        """ Returns a copy of the scene in which the objects, and the static
+        objects, are grouped into nested unions with tight bounded_by boxes.
+        This speeds up the rendering of scenes made of thousands of objects,
+        such as molecules. See geometry.bounding_hierarchy. """
+        from .geometry import bounding_hierarchy
+        new = self.copy()
+        new.objects = bounding_hierarchy(self.objects, leaf_size, self.instances)
+        new.static = bounding_hierarchy(self.static, leaf_size, self.instances)
         return new
 
     def render(self, outfile=None, height=None, width=None,
                      quality=None, antialiasing=None, remove_temp=True,
                      auto_camera_angle=True, show_window=False, tempfile=None,
-                     includedirs=None, output_alpha=False):
+                     includedirs=None, output_alpha=False, stdin=False,
+                     bits_per_color=None, options=None, return_stats=False):
 
         """ Renders the scene to a PNG, a numpy array, or the IPython Notebook.
 
@@ -69,6 +358,7 @@ class Scene:
           Name of the output:
           - "myfile.png" to output a PNG file
           - None to output a numpy array (if numpy is installed).
+          - 'bytes' to return the PNG image as bytes
           - 'ipython' (and call this function last in an IPython Notebook)
 
         height
@@ -79,27 +369,100 @@ class Scene:
 
         output_alpha
           If true, the background will be transparent,
-        rather than the default black background.  Note
-        that this option is ignored if rendering to a
-        numpy array, due to limitations of the intermediate
-        ppm format.
+        rather than the default black background. Numpy
+        arrays then get a fourth (alpha) channel, which
+        requires imageio.
 
-        """
+        bits_per_color
+          Bits per color channel of the output, e.g. 16.
 
-        if auto_camera_angle and width is not None:
-            self.camera = self.camera.add_args(['right', [1.0*width/height, 0,0]])
+        stdin
+          If true, the scene is streamed to POV-Ray on its standard input
+          instead of being written to a temporary file. See
+          io.render_povstring.
+
+        options
+          List of other POV-Ray command line options.
+
+        return_stats
+          If true, returns a tuple (result, stats) with the statistics of
+          the render, such as the parse and trace times and the number of
+          rays. See io.parse_povray_stats.
 
-        return render_povstring(str(self), outfile, height, width,
+        """
+
+        scene = self._with_aspect(width, height, auto_camera_angle)
+        return render_povstring(scene, outfile, height, width,
                                 quality, antialiasing, remove_temp, show_window,
-                                tempfile, includedirs, output_alpha)
+                                tempfile, includedirs, output_alpha, stdin,
+                                bits_per_color, options, return_stats)
+
+    async def render_async(self, outfile=None, height=None, width=None,
+                           quality=None, antialiasing=None,
+                           auto_camera_angle=True, show_window=False,
+                           includedirs=None, output_alpha=False,
+                           bits_per_color=None, options=None,
+                           return_stats=False):
+        """ Coroutine rendering the scene like render, for use with asyncio:
+        POV-Ray runs while the event loop does other work (e.g. building the
+        next scene), and cancelling the coroutine stops POV-Ray. The scene is
+        streamed to POV-Ray on its standard input. See
+        io.render_povstring_async. """
+        scene = self._with_aspect(width, height, auto_camera_angle)
+        return await render_povstring_async(scene, outfile, height, width,
+                                            quality, antialiasing, show_window,
+                                            includedirs, output_alpha,
+                                            bits_per_color, options,
+                                            return_stats)
+
+    def _with_aspect(self, width, height, auto_camera_angle=True):
+        """ The scene with the camera's right vector set to the aspect ratio
+        of the image, if auto_camera_angle is set and the size is known """
+        if auto_camera_angle and width is not None:
+            return self.set_camera(
+                self.camera.add_args(['right', [1.0*width/height, 0,0]]))
+        return self
 
 
 class POVRayElement:
+    """ Base class of all POV-Ray elements.
+
+    The POV-Ray text of an element that is serialized more than once (static
+    objects reused across frames, modifiers shared by many objects...) is
+    kept in a cache, so that it is only generated once. The cache is
+    invalidated whenever the arguments of an already serialized element are
+    changed, either by assigning ``args`` or by modifying the list in place.
+    Changes made in place to nested vectors or numpy arrays are not
+    detected: call clear_caches() after such changes.
+    """
+
+    __slots__ = ('_args', '_text_cache')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Name used in the POV-Ray source, computed once per class
+        cls._pov_name = cls.transformed_name().lower()
+
     def __init__(self, *args):
-        self.args = list(args)
+        self._args = _ArgList(args)
+        self._text_cache = None
+
+    @property
+    def args(self):
+        return self._args
+
+    @args.setter
+    def args(self, args):
+        if getattr(self, '_args', None) is not None and self._args.serialized:
+            # The text of the former arguments may be cached by any parent
+            clear_caches()
+        self._args = _ArgList(args)
+        self._text_cache = None
 
     def copy(self):
-        return deepcopy(self)
+        """ Returns a copy of the element with its own list of arguments;
+        the arguments themselves (sub-elements, vectors) are shared. """
+        return self._with_args(list(self.args))
 
     @classmethod
     def transformed_name(cls):
@@ -111,25 +474,45 @@ class POVRayElement:
         webbrowser.open(WIKIREF + cls.transformed_name())
 
     def add_args(self, new_args):
-        new = self.copy()
-        new.args += new_args
-        return new
+        return self._with_args(self.args + list(new_args))
 
     def __str__(self):
-        # Tranforms Sphere=>sphere, and LightSource=>light_source
-        name = self.transformed_name().lower()
+        return "".join(self.iter_chunks())
+
+    def _iter_tokens(self):
+        yield "%s {\n" % self._pov_name
+        for e in _joined(self.args, "\n"):
+            yield e
+        yield " \n}"
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """ Yields the POV-Ray source of the element and its subtree as
+        successive strings of about `chunk_size` characters. """
+        return _serialize(self._iter_tokens(), chunk_size)
+
+    def _with_args(self, args):
+        """ Returns a shallow copy of the element with other arguments """
+        new = shallow_copy(self)
+        new._args = None
+        new.args = args
+        return new
 
-        return "%s {\n%s \n}" % (name, "\n".join([str(format_if_necessary(e))
-                                                  for e in self.args]))
+    def _is_reference(self):
+        """ True for elements that only name a declared identifier, like
+        Texture('T_Stone18') """
+        return (len(self.args) == 1 and isinstance(self.args[0], str)
+                and re.match(r"^\w+$", self.args[0]) is not None)
 
 
 class POVRayMap(POVRayElement):
-    def __str__(self):
-        name = self.transformed_name().lower()
-        return "%s { %s }"%(name,
-                            "\n".join([ "[ %s ]"%(" ".join(
-                                [str(format_if_necessary(e)) for e in l]))
-                                        for l in self.args]))
+    def _iter_tokens(self):
+        yield "%s { " % self._pov_name
+        for i, l in enumerate(self.args):
+            yield "\n[ " if i else "[ "
+            for e in _joined(l, " "):
+                yield e
+            yield " ]"
+        yield " }"
 
 class Macro(POVRayElement):
     """ This special class enables to use macros like
@@ -137,9 +520,361 @@ class Macro(POVRayElement):
     Macro('Tetrahedron_by_Corners', P,Q,R,S,R1,R2, filled)
     """
 
-    def __str__(self):
-        return "%s( %s)"%(self.args[0], " , ".join([str(format_if_necessary(e))
-                                                   for e in self.args[1:]]))
+    def _iter_tokens(self):
+        yield "%s( " % self.args[0]
+        for e in _joined(self.args[1:], " , "):
+            yield e
+        yield ")"
+
+
+class _Primitive(POVRayElement):
+    """ Base class of the simple objects scenes are made of by the thousands
+    (Sphere, Cylinder, Cone, Box). Instances have slots instead of a dict,
+    their leading geometric arguments are exposed as attributes and are
+    serialized in one go. """
+
+    __slots__ = ()
+    # Number of leading arguments describing the geometry
+    _geometry = 0
+
+    # Indices of the geometric arguments which are points
+    _points = ()
+
+    @property
+    def modifiers(self):
+        """ The arguments following the geometry (textures, transforms...) """
+        return self.args[self._geometry:]
+
+    def _canonical_position(self):
+        """ The first point of the geometry, as a list of floats, or None if
+        it is not a plain vector """
+        try:
+            position = [float(c) for c in self.args[self._points[0]]]
+        except (TypeError, ValueError):
+            return None
+        return position if len(position) == 3 else None
+
+    def _translated_geometry(self, position):
+        """ The geometric arguments with `position` subtracted from the points,
+        rounded so that equal shapes get the same text """
+        geometry = list(self.args[:self._geometry])
+        for i in self._points:
+            geometry[i] = [float("%.12g" % (float(c) - p))
+                           for c, p in zip(geometry[i], position)]
+        return geometry
+
+    def _iter_tokens(self):
+        args = self.args
+        if len(args) < self._geometry:
+            yield from POVRayElement._iter_tokens(self)
+            return
+        yield "%s {\n%s" % (self._pov_name, "\n".join(
+            [str(format_if_necessary(e)) for e in args[:self._geometry]]))
+        for e in args[self._geometry:]:
+            yield "\n"
+            yield e if isinstance(e, POVRayElement) else str(format_if_necessary(e))
+        yield " \n}"
+
+
+def _arg_property(index, doc):
+    """ Exposes args[index] of an element as a read/write attribute """
+    def getter(self):
+        return self.args[index]
+
+    def setter(self, value):
+        self.args[index] = value
+
+    return property(getter, setter, doc=doc)
+
+
+def write_frames(scenes, filename, chunk_size=CHUNK_SIZE):
+    """ Writes a POV-Ray file `filename` which renders each scene of the dict
+    `scenes` {frame number: Scene} as that frame of an animation (see the
+    +KFI/+KFF options of POV-Ray). Each scene is streamed to a file of its
+    own, '<filename without .pov>_<frame>.pov', which `filename` includes
+    for the current frame_number. POV-Ray parses the whole scene again for
+    every frame, so each frame only parses its own file. Returns the names
+    of the frame files.
+
+    Examples
+    ---------
+
+    >>> write_frames({i: make_scene(i) for i in range(10, 20)}, "frames.pov")
+
+    and render "frames.pov" with the options ['+KFI10', '+KFF19'].
+    """
+    root = os.path.splitext(filename)[0]
+    frame_files = []
+    for frame in sorted(scenes):
+        frame_file = "%s_%d.pov" % (root, frame)
+        with open(frame_file, "w") as f:
+            scenes[frame].write(f, chunk_size)
+        frame_files.append(frame_file)
+    with open(filename, "w") as f:
+        f.write('#include concat("%s_", str(frame_number, 0, 0), ".pov")\n' % root)
+    return frame_files
+
+
+def _lines(items):
+    """ Yields the items (elements, or anything else as a string) each
+    followed by a newline. """
+    for e in items:
+        yield e if isinstance(e, POVRayElement) else str(e)
+        yield "\n"
+
+
+def _joined(items, sep):
+    """ Yields the items separated by `sep`. POV-Ray elements are passed
+    through untouched, anything else is formatted to a string. """
+    for i, e in enumerate(items):
+        if i:
+            yield sep
+        if isinstance(e, POVRayElement):
+            yield e
+        else:
+            yield str(format_if_necessary(e))
+
+
+def _iter_elements(items):
+    """ Yields every POV-Ray element found in the (nested) list `items` and in
+    the arguments of these elements, walking the tree iteratively. """
+    stack = [iter(items)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, POVRayElement):
+                yield item
+                stack.append(iter(item.args))
+                break
+            if isinstance(item, (list, tuple)):
+                stack.append(iter(item))
+                break
+        else:
+            stack.pop()
+
+
+def _split_transforms(e):
+    """ Splits an object into a copy without its trailing transformations
+    (moved to the origin if possible, see Scene.instance_objects) and the
+    list of transformations that place it back. """
+    args = list(e.args)
+    end = len(args)
+    while (end >= 2 and isinstance(args[end - 2], str)
+           and args[end - 2] in ('translate', 'rotate', 'scale')):
+        end -= 2
+    transforms = args[end:]
+    args = args[:end]
+    if (isinstance(e, _Primitive) and len(args) >= e._geometry
+            and all(_position_invariant(a) for a in args[e._geometry:])):
+        position = e._canonical_position()
+        if position is not None:
+            args = e._translated_geometry(position) + args[e._geometry:]
+            transforms = ['translate', position] + transforms
+    return e._with_args(args), transforms
+
+
+def _position_invariant(e):
+    """ Whether a modifier looks the same wherever the object is placed """
+    if isinstance(e, str):
+        return e in OBJECT_FLAGS
+    if isinstance(e, Finish):
+        return True
+    if isinstance(e, Pigment):
+        # Plain colors only, no patterns or transformations
+        return all(not isinstance(a, POVRayElement) and
+                   (not isinstance(a, str) or a in COLOR_KEYWORDS)
+                   for a in e.args)
+    if isinstance(e, (Texture, Material)):
+        return (not e._is_reference() and
+                all(isinstance(a, POVRayElement) and _position_invariant(a)
+                    for a in e.args))
+    return False
+
+
+def _csg_depth(items):
+    """ Returns the deepest nesting of CSG objects in the (nested) list
+    `items`, walking the tree iteratively. """
+    deepest = 0
+    stack = [(iter(items), 0)]
+    while stack:
+        iterator, depth = stack[-1]
+        for item in iterator:
+            if isinstance(item, POVRayElement):
+                if isinstance(item, CSG_OBJECTS):
+                    deepest = max(deepest, depth + 1)
+                    stack.append((iter(item.args), depth + 1))
+                else:
+                    stack.append((iter(item.args), depth))
+                break
+            if isinstance(item, (list, tuple)):
+                stack.append((iter(item), depth))
+                break
+        else:
+            stack.pop()
+    return deepest
+
+
+def _substitute(items, replace):
+    """ Returns a copy of the (nested) list `items` in which each POV-Ray
+    element `e`, at any depth, is swapped for `replace(e)` unless that is
+    None, in which case the arguments of `e` are searched in turn.
+
+    Elements and lists are only copied along the paths leading to a
+    replacement; everything else is shared with the original tree.
+    """
+    # Each frame holds: original, iterator over its items, new items, and a
+    # function building the updated original from the new items
+    stack = [(items, iter(items), [], type(items))]
+    while stack:
+        original, iterator, new_items, rebuild = stack[-1]
+        for item in iterator:
+            if isinstance(item, POVRayElement):
+                replacement = replace(item)
+                if replacement is not None:
+                    new_items.append(replacement)
+                    continue
+                stack.append((item, iter(item.args), [], item._with_args))
+                break
+            if isinstance(item, (list, tuple)):
+                stack.append((item, iter(item), [], type(item)))
+                break
+            new_items.append(item)
+        else:
+            stack.pop()
+            old_items = (original.args if isinstance(original, POVRayElement)
+                         else original)
+            changed = any(a is not b for a, b in zip(new_items, old_items))
+            result = rebuild(new_items) if changed else original
+            if not stack:
+                return result
+            stack[-1][2].append(result)
+
+
+# Serialized texts are cached along with the generation they were made in;
+# the generation changes whenever a serialized element is modified.
+_generation = 0
+
+
+def clear_caches():
+    """ Invalidates the cached POV-Ray text of all elements """
+    global _generation
+    _generation += 1
+
+
+class _ArgList(list):
+    """ The list of arguments of an element. Modifying it after the element
+    has been serialized invalidates the cached texts. """
+
+    __slots__ = ('serialized',)
+
+    def __getattr__(self, name):
+        # Only called while the slot is unset, i.e. before the first serialization
+        if name == 'serialized':
+            return False
+        raise AttributeError(name)
+
+    def _modified(self):
+        if self.serialized:
+            clear_caches()
+
+    def __setitem__(self, *a):
+        list.__setitem__(self, *a)
+        self._modified()
+
+    def __delitem__(self, *a):
+        list.__delitem__(self, *a)
+        self._modified()
+
+    def __iadd__(self, other):
+        list.extend(self, other)
+        self._modified()
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._modified()
+        return self
+
+    def append(self, *a):
+        list.append(self, *a)
+        self._modified()
+
+    def extend(self, *a):
+        list.extend(self, *a)
+        self._modified()
+
+    def insert(self, *a):
+        list.insert(self, *a)
+        self._modified()
+
+    def pop(self, *a):
+        item = list.pop(self, *a)
+        self._modified()
+        return item
+
+    def remove(self, *a):
+        list.remove(self, *a)
+        self._modified()
+
+    def clear(self):
+        list.clear(self)
+        self._modified()
+
+    def sort(self, **kw):
+        list.sort(self, **kw)
+        self._modified()
+
+    def reverse(self):
+        list.reverse(self)
+        self._modified()
+
+
+def _serialize(tokens, chunk_size=CHUNK_SIZE):
+    """ Expands a stream of strings and POV-Ray elements into text chunks.
+
+    The element tree is walked with an explicit stack of token generators
+    rather than by recursion, so nesting depth is only limited by memory, and
+    only about `chunk_size` characters are held at any time.
+
+    Elements with a valid cached text are written from the cache. An element
+    met for the second time (in this or an earlier serialization) has its
+    text captured into the cache, unless one of its parents is already being
+    captured, so that only the outermost reused subtree is stored.
+    """
+    stack = [(iter(tokens), None)]
+    capture = None
+    buffer, size = [], 0
+    while stack:
+        for token in stack[-1][0]:
+            if isinstance(token, POVRayElement):
+                if type(token).__str__ is not POVRayElement.__str__:
+                    # Subclasses with their own __str__ are serialized by it
+                    token = str(token)
+                elif (token._text_cache is not None
+                      and token._text_cache[0] == _generation):
+                    token = token._text_cache[1]
+                else:
+                    args = token.args
+                    if args.serialized and capture is None:
+                        capture = []
+                        stack.append((token._iter_tokens(), token))
+                    else:
+                        stack.append((token._iter_tokens(), None))
+                    args.serialized = True
+                    break
+            buffer.append(token)
+            size += len(token)
+            if capture is not None:
+                capture.append(token)
+            if size >= chunk_size:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        else:
+            captured = stack.pop()[1]
+            if captured is not None:
+                captured._text_cache = (_generation, "".join(capture))
+                capture = None
+    if buffer:
+        yield "".join(buffer)
 
 # =============================================================================
 # =============================================================================
@@ -344,12 +1079,18 @@ class Prism(POVRayElement):
          'sturm'  | OBJECT_MODIFIER"""
 
 
-class Sphere(POVRayElement):
+class Sphere(_Primitive):
     """Sphere(
            [Center], Radius
            *[OBJECT_MODIFIERS...]
            )"""
 
+    __slots__ = ()
+    _geometry = 2
+    _points = (0,)
+    center = _arg_property(0, "[Center]")
+    radius = _arg_property(1, "Radius")
+
 
 class SphereSweep(POVRayElement):
     """SphereSweep(
@@ -397,26 +1138,47 @@ class Torus(POVRayElement):
          'sturm'  | OBJECT_MODIFIER"""
 
 
-class Box(POVRayElement):
+class Box(_Primitive):
     """Box(
            [Corner_1], [Corner_2]
            *[OBJECT_MODIFIERS...]
            )"""
 
+    __slots__ = ()
+    _geometry = 2
+    _points = (0, 1)
+    corner1 = _arg_property(0, "[Corner_1]")
+    corner2 = _arg_property(1, "[Corner_2]")
+
 
-class Cone(POVRayElement):
+class Cone(_Primitive):
     """Cone(
            [Base_Point], Base_Radius, [Cap_Point], Cap_Radius
            *[ 'open', ]*[OBJECT_MODIFIERS...]
            )"""
 
+    __slots__ = ()
+    _geometry = 4
+    _points = (0, 2)
+    base_point = _arg_property(0, "[Base_Point]")
+    base_radius = _arg_property(1, "Base_Radius")
+    cap_point = _arg_property(2, "[Cap_Point]")
+    cap_radius = _arg_property(3, "Cap_Radius")
 
-class Cylinder(POVRayElement):
+
+class Cylinder(_Primitive):
     """Cylinder(
            [Base_Point], [Cap_Point], Radius
            *[ 'open', ]*[OBJECT_MODIFIERS...]
            )"""
 
+    __slots__ = ()
+    _geometry = 3
+    _points = (0, 1)
+    base_point = _arg_property(0, "[Base_Point]")
+    cap_point = _arg_property(1, "[Cap_Point]")
+    radius = _arg_property(2, "Radius")
+
 
 class HeightField(POVRayElement):
     """HeightField(
@@ -600,7 +1362,73 @@ class Mesh2(POVRayElement):
          inside_vector [direction] | OBJECT_MODIFIERS"
     """
 
-class FaceIndices(POVRayElement):
+    @classmethod
+    def from_arrays(cls, vertices, faces, normals=None, uvs=None,
+                    textures=None, face_textures=None, modifiers=(),
+                    precision=FLOAT_PRECISION):
+        """ Builds a mesh from numpy arrays, each list being formatted in a
+        single vectorized pass.
+
+        Parameters
+        ------------
+
+        vertices
+          (V, 3) array of vertex coordinates.
+
+        faces
+          (F, 3) integer array of vertex indices.
+
+        normals
+          Optional (V, 3) array of per-vertex normals.
+
+        uvs
+          Optional (V, 2) array of per-vertex uv coordinates.
+
+        textures, face_textures
+          Optional list of Texture elements, and (F,) or (F, 3) integer array
+          of indices in that list for each face (or for each of its corners).
+
+        modifiers
+          Other arguments of the mesh (inside_vector, textures, transforms...)
+
+        precision
+          Significant digits of the coordinates.
+        """
+        args = [VertexVectors.from_array(vertices, precision)]
+        if normals is not None:
+            args.append(NormalVectors.from_array(normals, precision))
+        if uvs is not None:
+            args.append(UvVectors.from_array(uvs, precision))
+        if textures:
+            args.append(TextureList(len(textures), *textures))
+        args.append(FaceIndices.from_array(faces, face_textures))
+        return cls(*(args + list(modifiers)))
+
+class _MeshList(POVRayElement):
+    """ Base class of the lists of vectors and indices of a Mesh2. Items are
+    separated by commas, which POV-Ray needs to tell a texture index from a
+    following vector. """
+
+    def _iter_tokens(self):
+        yield "%s {\n" % self._pov_name
+        for e in _joined(self.args, ",\n"):
+            yield e
+        yield " \n}"
+
+    @classmethod
+    def from_array(cls, arr, precision=FLOAT_PRECISION):
+        """ Builds the list from a (N, d) numpy array in a single vectorized
+        formatting pass, e.g. VertexVectors.from_array(vertices) """
+        if not numpy_found:
+            raise IOError("Function from_array requires numpy installed.")
+        arr = numpy.asarray(arr)
+        if arr.ndim != 2:
+            raise ValueError("%s.from_array expects a 2D array, got shape %s"
+                             % (cls.__name__, arr.shape))
+        return cls(len(arr), vectorize_array(arr, precision, ",\n"))
+
+
+class FaceIndices(_MeshList):
     """FaceIndices(
          number_of_faces,
          [index_a, index_b, index_c],
@@ -609,23 +1437,45 @@ class FaceIndices(POVRayElement):
          )
     """
 
+    @classmethod
+    def from_array(cls, faces, texture_indices=None):
+        """ Builds the face indices from a (F, 3) integer array, with
+        optional texture indices in a (F,) or (F, 3) integer array """
+        if not numpy_found:
+            raise IOError("Function from_array requires numpy installed.")
+        faces = numpy.asarray(faces)
+        if faces.ndim != 2 or faces.shape[1] != 3:
+            raise ValueError("Faces should be a (F, 3) array, got shape %s"
+                             % (faces.shape,))
+        if texture_indices is None:
+            return super().from_array(faces)
+        texture_indices = numpy.asarray(texture_indices).reshape((len(faces), -1))
+        template = "<{},{},{}>" + ",{}" * texture_indices.shape[1]
+        rows = numpy.column_stack([faces, texture_indices]).astype(int)
+        return cls(len(faces), format_rows(rows, template, sep=",\n"))
+
+
+class NormalIndices(_MeshList):
+    """
+    """
+
 
-class NormalIndices(POVRayElement):
+class NormalVectors(_MeshList):
     """
     """
 
 
-class NormalVectors(POVRayElement):
+class UvIndices(_MeshList):
     """
     """
 
 
-class UvIndices(POVRayElement):
+class UvVectors(_MeshList):
     """
     """
 
 
-class VertexVectors(POVRayElement):
+class VertexVectors(_MeshList):
     """
     """
 
@@ -1139,3 +1989,213 @@ class DensityMap(POVRayMap):
          DENSITY_MAP_IDENTIFIER | DENSITY_MAP_ENTRY...
        DENSITY_MAP_ENTRY:
          *[ 'Value', DENSITY_BODY ]"""
+
+
+# =============================================================================
+# =============================================================================
+# ======= Batches of objects, written in one vectorized pass (no POV help) ====
+# =============================================================================
+# =============================================================================
+
+class _PrimitiveArray(POVRayElement):
+    """ Base class of the batches of identical primitives held in numpy
+    arrays. The members are grouped by texture, each group being written as
+    a union with a single texture. The args are the modifiers of the whole
+    batch. The arrays are made read-only, as the text of the batch may be
+    cached.
+
+    With write_data, the members can instead be written to a CSV data file,
+    which the scene reads back with a #fopen/#read/#while loop. The scene
+    text then stays a few lines long whatever the number of members, and
+    POV-Ray parses the numbers much faster than unrolled objects. """
+
+    __slots__ = ('texture_ids', 'textures', 'precision', 'data_file')
+    # Row template of one member, with one {} per column of _columns()
+    _template = None
+    # Per-member arrays, in the order of the constructor arguments
+    _fields = ()
+
+    def __init__(self, texture_ids, textures, modifiers, precision):
+        POVRayElement.__init__(self, *modifiers)
+        n = len(self._columns())
+        if texture_ids is None:
+            texture_ids = numpy.zeros(n, dtype=int)
+            textures = [] if textures is None else list(textures)[:1]
+        else:
+            texture_ids = numpy.asarray(texture_ids, dtype=int).reshape(n)
+            textures = list(textures or [])
+            if n and not 0 <= texture_ids.min() <= texture_ids.max() < len(textures):
+                raise ValueError("Texture ids should index the %d textures"
+                                 % len(textures))
+        self.texture_ids = _readonly(texture_ids)
+        self.textures = textures
+        self.precision = precision
+        self.data_file = None
+
+    def _columns(self):
+        """ (N, k) array of the numbers describing each member """
+        raise NotImplementedError
+
+    def _subset(self, mask):
+        """ Returns a batch of the members selected by the boolean (or index)
+        array `mask`, with the same textures and modifiers. """
+        fields = [getattr(self, name)[mask] for name in self._fields]
+        texture_ids = self.texture_ids[mask] if self.textures else None
+        return type(self)(*fields, texture_ids, self.textures, *self.args,
+                          precision=self.precision)
+
+    def write_data(self, filename):
+        """ Writes the members (one row of numbers each, followed by the
+        texture id) to the CSV file `filename`, and returns a copy of the
+        batch that reads them from that file when rendered. """
+        filename = os.path.abspath(filename)
+        rows = numpy.column_stack([self._columns(), self.texture_ids])
+        with open(filename, 'w') as f:
+            f.write(format_rows(rows, ",".join(["{}"] * rows.shape[1]),
+                                self.precision, ",\n"))
+        new = self._with_args(list(self.args))
+        new.data_file = filename
+        return new
+
+    def _iter_data_tokens(self):
+        """ The #fopen/#read/#while loop creating the members from the data
+        file. Identifiers are derived from the file name, which keeps the
+        text identical between runs. """
+        tag = "VP_%s" % hashlib.sha1(self.data_file.encode()).hexdigest()[:8]
+        n_columns = self._columns().shape[1]
+        names = ["%s_%d" % (tag, i) for i in range(n_columns + 1)]
+        member = self._template.replace("{}", "%s") % tuple(names[:-1])
+        if len(self.textures) > 1:
+            # One texture per member, looked up in an array by its id
+            yield "#declare %s_T = array[%d] {" % (tag, len(self.textures))
+            for e in _joined(self.textures, ", "):
+                yield e
+            yield "}\n"
+            member = "%s texture{%s_T[%s]}}" % (member[:-1], tag, names[-1])
+        yield '#fopen %s_F "%s" read\nunion {\n' % (tag, self.data_file)
+        yield "#while (defined(%s_F))\n" % tag
+        yield "#read (%s_F, %s)\n" % (tag, ", ".join(names))
+        yield "%s\n#end" % member
+        if len(self.textures) == 1:
+            yield "\n"
+            yield self.textures[0]
+        for e in self.args:
+            yield "\n"
+            yield e if isinstance(e, POVRayElement) else str(format_if_necessary(e))
+        yield " \n}"
+
+    def _iter_tokens(self):
+        if not len(self.texture_ids):
+            return
+        if self.data_file is not None:
+            yield from self._iter_data_tokens()
+            return
+        columns = self._columns()
+        groups = numpy.unique(self.texture_ids)
+        nested = len(groups) > 1
+        yield "union {\n"
+        for i, group in enumerate(groups):
+            if i:
+                yield "\n"
+            if nested:
+                yield "union {\n"
+            yield format_rows(columns[self.texture_ids == group],
+                              self._template, self.precision)
+            if group < len(self.textures):
+                yield "\n"
+                yield self.textures[group]
+            if nested:
+                yield " \n}"
+        for e in self.args:
+            yield "\n"
+            yield e if isinstance(e, POVRayElement) else str(format_if_necessary(e))
+        yield " \n}"
+
+
+class SphereArray(_PrimitiveArray):
+    """SphereArray(
+           [[Center_1], [Center_2], ...], Radius | [Radius_1, Radius_2, ...],
+           *[[Texture_Id_1, Texture_Id_2, ...], [TEXTURE_1, TEXTURE_2, ...]]
+           *[OBJECT_MODIFIERS...]
+           )
+       Many spheres as one union, e.g. all atoms of a molecule. Sphere i gets
+       TEXTURE_<Texture_Id_i>; without texture ids, the first texture (if
+       any) is used for all spheres."""
+
+    __slots__ = ('centers', 'radii')
+    _template = "sphere{<{},{},{}>,{}}"
+    _fields = ('centers', 'radii')
+
+    def __init__(self, centers, radii, texture_ids=None, textures=None,
+                 *modifiers, precision=FLOAT_PRECISION):
+        if not numpy_found:
+            raise IOError("SphereArray requires numpy installed.")
+        self.centers = _readonly(numpy.asarray(centers, dtype=float).reshape((-1, 3)))
+        self.radii = _readonly(numpy.broadcast_to(
+            numpy.asarray(radii, dtype=float), len(self.centers)))
+        _PrimitiveArray.__init__(self, texture_ids, textures, modifiers,
+                                 precision)
+
+    def _columns(self):
+        return numpy.column_stack([self.centers, self.radii])
+
+
+class CylinderArray(_PrimitiveArray):
+    """CylinderArray(
+           [[Base_Point_1], ...], [[Cap_Point_1], ...],
+           Radius | [Radius_1, Radius_2, ...],
+           *[[Texture_Id_1, Texture_Id_2, ...], [TEXTURE_1, TEXTURE_2, ...]]
+           *[OBJECT_MODIFIERS...]
+           )
+       Many cylinders as one union, e.g. all bonds of a molecule. Textures
+       are assigned as in SphereArray."""
+
+    __slots__ = ('base_points', 'cap_points', 'radii')
+    _template = "cylinder{<{},{},{}>,<{},{},{}>,{}}"
+    _fields = ('base_points', 'cap_points', 'radii')
+
+    def __init__(self, base_points, cap_points, radii, texture_ids=None,
+                 textures=None, *modifiers, precision=FLOAT_PRECISION):
+        if not numpy_found:
+            raise IOError("CylinderArray requires numpy installed.")
+        self.base_points = _readonly(numpy.asarray(base_points, dtype=float).reshape((-1, 3)))
+        self.cap_points = _readonly(numpy.asarray(cap_points, dtype=float).reshape((-1, 3)))
+        if self.cap_points.shape != self.base_points.shape:
+            raise ValueError("CylinderArray needs as many cap points as base points")
+        self.radii = _readonly(numpy.broadcast_to(
+            numpy.asarray(radii, dtype=float), len(self.base_points)))
+        _PrimitiveArray.__init__(self, texture_ids, textures, modifiers,
+                                 precision)
+
+    def _columns(self):
+        return numpy.column_stack([self.base_points, self.cap_points, self.radii])
+
+
+def _readonly(arr):
+    """ Returns a read-only version of the array (copied if it was writable) """
+    if arr.flags.writeable:
+        arr = arr.copy()
+        arr.setflags(write=False)
+    return arr
+
+
+# Modifiers that Scene.hoist_declares writes once as #declare when repeated
+HOISTABLE_MODIFIERS = (Texture, InteriorTexture, Material, Pigment, Normal,
+                       Finish, Interior)
+
+# Objects combining other objects, whose nesting Scene.profile reports
+CSG_OBJECTS = (Union, Intersection, Difference, Merge, _PrimitiveArray)
+
+# Objects that Scene.instance_objects may declare once and place many times
+INSTANCEABLE_OBJECTS = (Sphere, Box, Cone, Cylinder, Torus, Disc, Blob, Text,
+                        Lathe, Sor, Prism, SphereSweep, Superellipsoid, Ovus,
+                        Mesh, Mesh2, Polygon, Triangle, SmoothTriangle, Union,
+                        Intersection, Difference, Merge, Object)
+
+# Object modifiers which do not depend on the position of the object
+OBJECT_FLAGS = ('no_shadow', 'no_image', 'no_reflection', 'no_radiosity',
+                'hollow', 'double_illuminate', 'open')
+
+# Keywords of plain color pigments
+COLOR_KEYWORDS = ('color', 'colour', 'rgb', 'rgbf', 'rgbt', 'rgbft', 'srgb',
+                  'srgbf', 'srgbt', 'srgbft')